@@ -6,6 +6,10 @@ This script serves to derive information from the metadata of text
 collections that permit to predict the level of difficulty that the
 text collection presents for authorship attribution. 
 
+The metadata are read from the metadata store; partitions that are 
+missing or older than the metadata TSVs in metadata/ are built first 
+(see metadata_store.py). 
+
 """
 
 # === Import statements === 
@@ -13,19 +17,74 @@ text collection presents for authorship attribution.
 import pandas as pd
 from os.path import join
 import numpy as np
-import re
-from sklearn import preprocessing as sp
 import matplotlib.pyplot as plt
-import itertools
+
+import metadata_store
+
+
+# === Parameters === 
+
+columns = ["authorlabel", "firsted-yr", "numwords", "sizeCat", "reprintCount", "time-slot"]
+default_year = 1880 # For novels without a known year of first publication
 
 
 # === Functions === 
 
-def read_csv(csvfile): 
-    with open(csvfile, "r", encoding="utf8") as infile: 
-        metadata = pd.read_csv(infile, sep="\t")
-        #print(metadata.head())
-        return metadata
+def load_metadata(langs): 
+    """
+    Load the metadata of all collections into one frame 
+    from the metadata store (see metadata_store.load_metadata). 
+    """
+    metadata = metadata_store.load_metadata(langs, columns)
+    metadata["collection"] = metadata["collection"].astype(str)
+    metadata["numwords"] = metadata["numwords"].astype(float)
+    for column in ["sizeCat", "reprintCount", "time-slot"]: 
+        metadata[column] = metadata[column].astype(object)
+    # Publication year data is often incomplete / inconsistent
+    metadata["yearPub"] = metadata["firsted-yr"].str.extract("(\\d{4})", expand=False).astype(float).fillna(default_year)
+    return metadata
+
+
+def minmax_scale(data, groups=None): 
+    """
+    Scale each column to a range of 0-1 (within each group, if given). 
+    Columns without any range are set to 0. 
+    """
+    if groups is None: 
+        minimum = data.min()
+        maximum = data.max()
+    else: 
+        minimum = data.groupby(groups).transform("min")
+        maximum = data.groupby(groups).transform("max")
+    span = maximum - minimum
+    span = span.where(span != 0, 1)
+    return (data - minimum) / span
+
+
+def get_appearance_codes(metadata, column): 
+    """
+    Number the values of a column within each author in the order
+    in which they first appear (as pd.factorize does per author;
+    missing values get -1). 
+    """
+    keys = [metadata["collection"], metadata["authorlabel"]]
+    first = ~metadata.duplicated(["collection", "authorlabel", column]) & metadata[column].notna()
+    codes = first.astype(int).groupby(keys).cumsum() - 1
+    codes = codes.where(first).groupby(keys + [metadata[column]]).transform("first")
+    return codes.fillna(-1)
+
+
+def get_mean_diffs(means): 
+    """
+    Mean absolute difference between all pairs of different authors 
+    within each collection. 
+    """
+    mean_diffs = {}
+    for lang, values in means.groupby(level="collection"): 
+        values = values.to_numpy()
+        diffs = np.abs(values[:,None] - values[None,:])
+        mean_diffs[lang] = np.sum(diffs) / (len(values) * (len(values) - 1))
+    return pd.Series(mean_diffs)
 
 
 def get_author_variability(metadata): 
@@ -52,43 +111,28 @@ def get_author_variability(metadata):
     
     Variance is calculated for each category, either by looking at the
     number of different values (for the categorical values) or at the
-    standard deviation of the values (for the continuous variables), then
-    normalized to a range of 0-1 using a min/max scaler, and aggregated
-    to a single score using an unweighted mean. 
-          
+    (population) standard deviation of the values (for the continuous 
+    variables), then normalized to a range of 0-1 within each collection, 
+    and aggregated to a single score using an unweighted mean. 
+    
+    All collections are processed at once; the result is indexed 
+    by collection and author. 
     """
-    author_var = {}
-    metadata = metadata.groupby("authorlabel")
-    for name,group in metadata: 
-        #print(name)
-        # Publication year data is often incomplete / inconsistent
-        year_Pub = []
-        for year in list(group.loc[:,"firsted-yr"]):
-            try: 
-                year = int(re.findall("\d\d\d\d", str(year))[0])
-                year_Pub.append(year)
-            except: 
-                year_Pub.append(1880)
-        var_yearPub = np.std(year_Pub)
-        var_numWords = np.std(group.loc[:,"numwords"])
-        var_sizeCat = len(set(group.loc[:,"sizeCat"]))
-        var_reprintCount = len(set(group.loc[:,"reprintCount"]))
-        var_timeSlot = len(set(group.loc[:,"time-slot"]))
-        author_var[name] = [var_yearPub, var_numWords, var_sizeCat, var_reprintCount, var_timeSlot]
-    author_var = pd.DataFrame(author_var).T
-    author_var.columns = ["yearPub", "numWords", "sizeCat", "reprintCount", "timeSlot"]
+    authors = metadata.groupby(["collection", "authorlabel"])
+    author_var = pd.DataFrame({"yearPub" : authors["yearPub"].std(ddof=0), 
+                               "numWords" : authors["numwords"].std(ddof=0), 
+                               "sizeCat" : authors["sizeCat"].nunique(dropna=False), 
+                               "reprintCount" : authors["reprintCount"].nunique(dropna=False), 
+                               "timeSlot" : authors["time-slot"].nunique(dropna=False)}).astype(float)
     # Scaling of each column to make values comparable and aggregateable
-    scaler = sp.MinMaxScaler()
-    author_var = pd.DataFrame(scaler.fit_transform(author_var), columns=author_var.columns, index=author_var.index)
+    author_var = minmax_scale(author_var, groups="collection")
     # Create an aggregate value, here a simple unweighted mean for each author
-    author_var["aggregated"] = np.mean(author_var, axis=1)
+    author_var["aggregated"] = author_var.mean(axis=1)
     author_var["prediction"] = 1-author_var["aggregated"]
-    author_var.sort_values("prediction", ascending=True, inplace=True)
-    #print(author_var)
     return author_var
 
 
-def get_colldata(lang, metadata, author_var): 
+def get_colldata(metadata, author_var): 
 
     """
     However, the variation between authors comes into play as well. 
@@ -100,48 +144,21 @@ def get_colldata(lang, metadata, author_var):
     However, this is true only if the individual value profiles of the
     authors differ from each other. This is also tested in this function.
     
-    
+    Note: mean_diffs_numWords now compares the mean length of each 
+    author's novels. The previous version overwrote the list of means 
+    with the word counts of the current author in each iteration, so 
+    that it compared the novels of the last author (alphabetically) 
+    in each collection instead. 
     """
-    one_coll_var = {}
-    # Mean collection-level variability
-    one_coll_var["mean_var"] = np.mean(author_var["aggregated"])
-    
+    metadata = metadata.assign(**{column : get_appearance_codes(metadata, column) 
+                                  for column in ["time-slot", "sizeCat", "reprintCount"]})
+    means = metadata.groupby(["collection", "authorlabel"])[["yearPub", "numwords", "time-slot", "sizeCat", "reprintCount"]].mean()
+    coll_var = pd.DataFrame({"mean_var" : author_var["aggregated"].groupby(level="collection").mean()})
     # Degree of difference between author metadata profiles    
-    metadata = metadata.groupby("authorlabel")
-    means_timeSlot = []
-    means_sizeCat = []
-    means_reprintCount = []
-    means_yearPub = []
-    means_numWords = []
-    for name,group in metadata: 
-        #print(name)
-        yearPub = []
-        for year in list(group.loc[:,"firsted-yr"]):
-            try: 
-                year = int(re.findall("\d\d\d\d", str(year))[0])
-                yearPub.append(year)
-            except: 
-                yearPub.append(1880)
-        # Calculate means
-        means_yearPub.append(np.mean(yearPub))
-        means_numWords = group.loc[:,"numwords"]
-        num_timeSlot, cat_timeSlot = pd.factorize(group.loc[:,"time-slot"])
-        means_timeSlot.append(np.mean(num_timeSlot))
-        num_sizeCat, cat_sizeCat = pd.factorize(group.loc[:,"sizeCat"])
-        means_sizeCat.append(np.mean(num_sizeCat))
-        num_reprintCount, cat_reprintCount = pd.factorize(group.loc[:,"reprintCount"])
-        means_reprintCount.append(np.mean(num_reprintCount))
-    #print(means_timeSlot)
-    one_coll_var["mean_diffs_yearPub"] = np.mean([abs(e[1] - e[0]) for e in itertools.permutations(means_yearPub, 2)])   
-    one_coll_var["mean_diffs_numWords"] = np.mean([abs(e[1] - e[0]) for e in itertools.permutations(means_numWords, 2)])   
-    one_coll_var["mean_diffs_timeSlot"] = np.mean([abs(e[1] - e[0]) for e in itertools.permutations(means_timeSlot, 2)])   
-    one_coll_var["mean_diffs_sizeCat"] = np.mean([abs(e[1] - e[0]) for e in itertools.permutations(means_sizeCat, 2)])
-    one_coll_var["mean_diffs_reprintCount"] = np.mean([abs(e[1] - e[0]) for e in itertools.permutations(means_reprintCount, 2)])
-    
-    # Make df
-    one_coll_var = pd.Series(one_coll_var, name=lang)
-    #print(one_coll_var, "\n")   
-    return one_coll_var  
+    for column, name in [("yearPub", "yearPub"), ("numwords", "numWords"), ("time-slot", "timeSlot"), 
+                         ("sizeCat", "sizeCat"), ("reprintCount", "reprintCount")]: 
+        coll_var["mean_diffs_" + name] = get_mean_diffs(means[column])
+    return coll_var
     
 
 def save_data(data, datafile): 
@@ -168,19 +185,16 @@ def plot_coll_data(coll_var):
 # === Main === 
 
 def main(langs): 
-    coll_var = {}
+    metadata = load_metadata(langs)
+    author_var = get_author_variability(metadata)
     for lang in langs: 
         print(lang)
-        metadata_file = join("..", "metadata", lang+"_metadata.tsv")
         author_variability_file = join("..", "hypotheses", lang+"_variability.tsv")
-        metadata = read_csv(metadata_file)
-        author_var = get_author_variability(metadata)
-        save_data(author_var, author_variability_file)
-        plot_author_data(author_var, lang, author_variability_file)
-        coll_var[lang] = get_colldata(lang, metadata, author_var)
-    coll_var = pd.DataFrame(coll_var).T
-    scaler = sp.MinMaxScaler()
-    coll_var = pd.DataFrame(scaler.fit_transform(coll_var), columns=coll_var.columns, index=coll_var.index)
+        lang_var = author_var.loc[lang].rename_axis(None).sort_values("prediction", ascending=True)
+        save_data(lang_var, author_variability_file)
+        plot_author_data(lang_var, lang, author_variability_file)
+    coll_var = get_colldata(metadata, author_var).loc[langs].rename_axis(None)
+    coll_var = minmax_scale(coll_var)
     coll_var["aggregated"] = np.mean(coll_var, axis=1)
     coll_var["prediction"] = coll_var["aggregated"] # identical in this case
     coll_var.sort_values("prediction", ascending=True, inplace=True)
@@ -192,4 +206,5 @@ def main(langs):
 #langs = ["deu", "fra"]
 langs = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
 
-main(langs)
+if __name__ == "__main__":
+    main(langs)
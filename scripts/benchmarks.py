@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+Script to time the current implementation of some processing steps
+against the previous one, checking that both give the same result.
+"""
+
+
+# === Import statements ===
+
+import re
+import glob
+import timeit
+from os.path import join, getsize
+
+import numpy as np
+
+import tei2txt
+import features
+import stylometry
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+repeats = 5
+
+mfws = list(range(100, 2001, 20))
+classifiers = ["delta", "eder", "wurzburg"]
+
+params = {"note":False, "head":False, "pb":False, "foreign":True, "trailer":False, "front":False, "back":False, "quote":True}
+
+
+# === Functions ===
+
+def clean_text_fourpass(text):
+    """
+    The previous version of tei2txt.clean_text.
+    """
+    text = re.sub("[ ]{2,20}", " ", text)
+    text = re.sub("\n{2,20}", "\n", text)
+    text = re.sub("[ \n]{2,20}", " \n", text)
+    text = re.sub("\t{1,20}", "\t", text)
+    return text
+
+
+def get_largest(language, number):
+    teifiles = glob.glob(join(wdir, "originals", language, "*.xml"))
+    return sorted(teifiles, key=getsize, reverse=True)[:number]
+
+
+def bench_clean_text(teifiles):
+    """
+    Compare the single-pass and the four-pass whitespace normalization
+    on the raw text (as joined by get_text) of the given files.
+    """
+    for teifile in teifiles:
+        text = " ".join(tei2txt.iter_text(teifile, params))
+        assert tei2txt.clean_text(text) == clean_text_fourpass(text)
+        old = min(timeit.repeat(lambda: clean_text_fourpass(text), number=1, repeat=repeats))
+        new = min(timeit.repeat(lambda: tei2txt.clean_text(text), number=1, repeat=repeats))
+        print("clean_text", tei2txt.get_filename(teifile), len(text), "chars:",
+              round(old*1000, 1), "ms (four passes) vs.", round(new*1000, 1), "ms (single pass)")
+
+
+def get_distances(test, train, classifier):
+    """
+    The previous kernel: distances between one test document and all
+    training documents.
+    """
+    if classifier == "delta":
+        return np.mean(np.abs(train - test), axis=1)
+    if classifier == "eder":
+        n = test.shape[0]
+        weights = (n - np.arange(n)) / n
+        return np.sum(np.abs(train - test) * weights, axis=1)
+    if classifier == "wurzburg":
+        norms = np.linalg.norm(train, axis=1) * np.linalg.norm(test)
+        return 1 - (train @ test) / norms
+    raise ValueError("Unknown classifier: " + classifier)
+
+
+def classify_loop(zscores, labels, classifier, mfw):
+    """
+    The previous version of stylometry.classify: one fold at a time.
+    """
+    zscores = zscores[:,:mfw]
+    labels = np.array(labels)
+    predictions = []
+    for i in range(len(labels)):
+        train = np.arange(len(labels)) != i
+        distances = get_distances(zscores[i], zscores[train], classifier)
+        predictions.append(labels[train][np.argmin(distances)])
+    return np.array(predictions)
+
+
+def bench_classify(language):
+    """
+    Compare the batched and the per-fold leave-one-out classification
+    over the full mfw sweep of one language, for each classifier.
+    """
+    filenames, labels, words, freqs = features.get_features(language, max(mfws))
+    zscores = features.get_zscores(freqs)
+    for classifier in classifiers:
+        for mfw in mfws:
+            assert np.array_equal(stylometry.classify(zscores, labels, classifier, mfw), classify_loop(zscores, labels, classifier, mfw))
+        old = min(timeit.repeat(lambda: [classify_loop(zscores, labels, classifier, mfw) for mfw in mfws], number=1, repeat=repeats))
+        new = min(timeit.repeat(lambda: [stylometry.classify(zscores, labels, classifier, mfw) for mfw in mfws], number=1, repeat=repeats))
+        print("classify", language, classifier, len(labels), "documents,", len(mfws), "mfw settings:",
+              round(old*1000, 1), "ms (per fold) vs.", round(new*1000, 1), "ms (batched)")
+
+
+# === Main ===
+
+def main():
+    bench_clean_text(get_largest("pol", 5))
+    bench_classify("deu")
+
+
+if __name__ == "__main__":
+    main()
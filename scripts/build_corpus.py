@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Script to build the corpus outputs from the XML-TEI originals in one pass.
+
+Each file is parsed exactly once. The same tree is then (a) validated
+against the ELTeC schema, (b) used for the metadata table and (c) passed
+to the plain text extraction. Because the text extraction modifies the
+tree (stripping tags and elements), it always comes last.
+
+Builds are incremental: a manifest (metadata/build_manifest.json) keeps
+the content hash of every XML-TEI file and a fingerprint of the
+parameters, so that only new or changed files are processed again.
+Outputs of files deleted since the last build are removed; rows and
+plain texts without an XML-TEI file of their own are left as they are.
+
+Output: metadata/<lang>_metadata.tsv, plaintxt/<lang>/*.txt and the
+validation report metadata/validation_report.tsv, identical to running
+validate.py, extract_metadata.py and tei2txt_run.py one after the other.
+The partitions of the metadata store (see metadata_store.py) are
+updated for the collections whose metadata table changed, from the
+saved table and the token counts recorded in the manifest (only if
+pyarrow is installed).
+"""
+
+
+# === Import statements ===
+
+import os
+import csv
+import glob
+import importlib.util
+from os.path import join
+
+import validate
+import extract_metadata
+import tei2txt
+import tei2txt_run
+import tokens
+import manifest
+import metadata_store
+
+
+# === Files and folders ===
+
+wdir = join("..", "")
+languages = ["deu", "fra", "eng", "hun", "nor", "pol", "por", "rom"]
+rngfile = join(wdir, "scripts", "eltec-1.rng")
+modsfile = join(wdir, "scripts", "tei2txt_mods.csv")
+reportfile = join(wdir, "metadata", "validation_report.tsv")
+manifestfile = join(wdir, "metadata", "build_manifest.json")
+
+
+# === Parameters ===
+
+params = tei2txt_run.params # The parameters of the plain text extraction (set in tei2txt_run.py)
+store = importlib.util.find_spec("pyarrow") is not None # Update the metadata store (needs pyarrow)?
+
+
+# === Functions ===
+
+def get_paths(language):
+    paths = {"teipath" : join(wdir, "originals", language, "*.xml"),
+             "txtpath" : join(wdir, "plaintxt", language, ""),
+             "metadatafile" : join(wdir, "metadata", language+"_metadata.tsv"),
+             "modsfile" : modsfile}
+    return paths
+
+
+def process_file(teifile, paths, params, xpaths):
+    """
+    Parse one XML-TEI file and run all three steps on the same tree.
+    Returns the validation and metadata rows, the word counts (if
+    requested) and the number of tokens of the plain text (if saved).
+    """
+    filename = tei2txt.get_filename(teifile)
+    tei = validate.parse_tei(teifile)
+    # Validation and metadata only read the tree
+    validation, errors = validate.validate_xml(tei, filename, rngfile)
+    ids = validate.check_ids(teifile, tei)
+    report = {"language" : os.path.basename(os.path.dirname(teifile)),
+              "filename" : filename,
+              "valid" : validation,
+              "ids" : ids,
+              "errors" : " | ".join(errors)}
+    metadata = extract_metadata.get_metadata(tei, filename, xpaths)
+    # Text extraction strips elements from the tree, so it comes last
+    text = tei2txt.extract_text(tei, params)
+    if params["modernize"] == True:
+        text = tei2txt.modernize_text(text, paths)
+    counts = None
+    if params["counts"] == True:
+        counts = tei2txt.get_counts(text)
+    words = None
+    if params["plaintext"] == True:
+        tei2txt.save_text(text, paths, filename)
+        # Same tokens as tokens.count_words on the saved file
+        words = tokens.count_text(text.lower())
+    return report, metadata, counts, words
+
+
+def read_rows(tsvfile):
+    """
+    Read the rows of a previously saved TSV file (metadata table
+    or validation report) as dictionaries of strings.
+    """
+    if not os.path.exists(tsvfile):
+        return []
+    with open(tsvfile, "r", encoding="utf8", newline="") as infile:
+        return list(csv.DictReader(infile, delimiter="\t"))
+
+
+def get_plaintxt_words(built, teifiles, paths):
+    """
+    Number of tokens in the plain text of each file, as recorded in the
+    manifest. Files built before the numbers were recorded are counted
+    once from their plain text.
+    """
+    words = {}
+    for teifile in teifiles:
+        entry = built["files"].get(teifile)
+        if entry is None:
+            continue
+        filename = tei2txt.get_filename(teifile)
+        if "words" not in entry:
+            txtfile = join(paths["txtpath"], filename+".txt")
+            entry["words"] = tokens.count_words(txtfile) if os.path.exists(txtfile) else None
+        words[filename] = entry["words"]
+    return words
+
+
+def update_store(language, words):
+    """
+    Replace the partition of the metadata store from the metadata
+    table just saved. Only plain texts without token counts in the
+    manifest are read again.
+    """
+    table = metadata_store.read_table(language)
+    # Rows without an XML-TEI file of their own are counted from their plain text
+    missing = [filename for filename in table["filename"] if filename not in words]
+    words.update(zip(missing, metadata_store.count_plaintxt(language, missing)))
+    metadata_store.save_partition(metadata_store.type_table(table, [words.get(filename) for filename in table["filename"]]), language)
+
+
+def remove_stale(paths, removed):
+    """
+    Remove the plain text files of XML-TEI files that the manifest
+    recorded and that have been deleted since the last build.
+    """
+    for teifile in removed:
+        txtfile = join(paths["txtpath"], tei2txt.get_filename(teifile)+".txt")
+        if os.path.exists(txtfile):
+            print("Removing", txtfile)
+            os.remove(txtfile)
+
+
+# === Main ===
+
+def main(languages, params, xpaths, ordering, sorting):
+    """
+    Build all outputs, processing only the files that are new or
+    changed since the last build (or all files, if the parameters,
+    the XPaths or the schema changed). Rows of unchanged files are
+    kept in the metadata tables and the validation report.
+    """
+    built = manifest.load_manifest(manifestfile)
+    built.pop("fingerprint", None) # Global fingerprint of older builds
+    built.setdefault("fingerprints", {})
+    modshash = manifest.get_hash(modsfile) if params["modernize"] == True else None
+    # The tree is parsed here anyway, so streaming does not change the outputs
+    settings = {key : value for key, value in params.items() if key != "stream"}
+    fingerprint = manifest.get_fingerprint(settings, xpaths, manifest.get_hash(rngfile), modshash)
+    allreports = read_rows(reportfile)
+    for language in languages:
+        print("\n====== " + language + " ======")
+        # The fingerprint is recorded per language once it is built, so
+        # that an interrupted rebuild is resumed with the missing languages
+        fingerprint_ok = built["fingerprints"].get(language) == fingerprint
+        paths = get_paths(language)
+        tei2txt.helper(paths, params)
+        teifiles = sorted(glob.glob(paths["teipath"]))
+        hashes = {teifile : manifest.get_hash(teifile) for teifile in teifiles}
+        entries = {teifile : entry for teifile,entry in built["files"].items()
+                   if os.path.dirname(teifile) == os.path.dirname(paths["teipath"])}
+        changed, removed = manifest.compare(hashes, entries, fingerprint_ok)
+        print("FILES:", len(teifiles), "CHANGED:", len(changed), "REMOVED:", len(removed))
+        for teifile in removed:
+            del built["files"][teifile]
+        filenames = [tei2txt.get_filename(teifile) for teifile in teifiles]
+        outdated = [tei2txt.get_filename(teifile) for teifile in changed]
+        deleted = [tei2txt.get_filename(teifile) for teifile in removed]
+        # Keep the rows of unchanged files that still exist, and the rows
+        # of files without an XML-TEI file that the build never recorded
+        allmetadata = [row for row in read_rows(paths["metadatafile"])
+                       if (fingerprint_ok and row["filename"] in filenames and row["filename"] not in outdated)
+                       or (row["filename"] not in filenames and row["filename"] not in deleted)]
+        allreports = [row for row in allreports if row["language"] != language
+                      or (fingerprint_ok and row["filename"] in filenames and row["filename"] not in outdated)]
+        if params["plaintext"] == True:
+            remove_stale(paths, removed)
+        for teifile in changed:
+            filename = tei2txt.get_filename(teifile)
+            try:
+                report, metadata, counts, words = process_file(teifile, paths, params, xpaths)
+                allreports.append(report)
+                allmetadata.append(metadata)
+                built["files"][teifile] = {"hash" : hashes[teifile], "counts" : counts, "words" : words}
+            except:
+                built["files"].pop(teifile, None)
+                print("ERROR!!!", filename)
+        if len(changed) > 0 or len(removed) > 0 or fingerprint_ok == False:
+            extract_metadata.save_metadata(allmetadata, paths["metadatafile"], ordering, sorting)
+            if store == True:
+                update_store(language, get_plaintxt_words(built, teifiles, paths))
+        allreports = sorted(allreports, key=lambda row: (row["language"], row["filename"]))
+        validate.save_report(allreports, reportfile)
+        built["fingerprints"][language] = fingerprint
+        manifest.save_manifest(built, manifestfile)
+    if params["counts"] == True:
+        len_category = {}
+        len_words = {}
+        for teifile,entry in built["files"].items():
+            if entry["counts"] is not None:
+                filename = tei2txt.get_filename(teifile)
+                len_words[filename], len_category[filename] = entry["counts"]
+        tei2txt.save_counts(len_words, len_category)
+
+
+if __name__ == "__main__":
+    main(languages, params, extract_metadata.xpaths, extract_metadata.ordering, extract_metadata.sorting)
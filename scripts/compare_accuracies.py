@@ -8,12 +8,16 @@ This script compares predicted and empirical accuracies.
 
 # === Import statements === 
 
+import os
 import pandas as pd
 from os.path import join
 import numpy as np
 import re
 import pygal
 
+import correlations
+import results_cube
+
 
 # === Functions === 
 
@@ -29,18 +33,13 @@ def get_predicted(csvfile):
         return predicted
 
 
-def get_empirical(csvfile, lang, mfw): 
-    with open(csvfile, "r", encoding="utf8") as infile: 
-        empirical = pd.read_csv(infile, sep=",", index_col=0)
-        empirical = empirical[empirical.index.str.contains(lang+"_")]
-        empirical = empirical.loc[:,str(mfw)]
-        empirical.index = empirical.index.str.replace(lang, "")
-        empirical.index = empirical.index.str.replace("_", "")
-        empirical = empirical.sort_values(ascending=False)
-        empirical = empirical.rename("empirical")
-        empirical  = empirical.rank()
-        #print(empirical)
-        return empirical
+def get_empirical(cube, classifier, lang, mfw): 
+    empirical = results_cube.select(cube, "authors_acc", classifier, lang, mfw)
+    empirical = empirical.sort_values(ascending=False)
+    empirical = empirical.rename("empirical")
+    empirical  = empirical.rank()
+    #print(empirical)
+    return empirical
 
 
 def compare_accuracies(lang, predicted, empirical): 
@@ -76,14 +75,25 @@ mfw = 1640
 # === Main === 
 
 def main(langs, mfw): 
+    cube = results_cube.load_cube(join("..", "results", ""))
     for lang in langs: 
         #print(lang)
         predicted_file = join("..", "hypotheses", lang+"_variability.tsv")
-        empirical_file = join("..", "results", "results_authors_acc_wurzburg.csv")
         predicted = get_predicted(predicted_file)
-        empirical = get_empirical(empirical_file, lang, mfw)
+        empirical = get_empirical(cube, "wurzburg", lang, mfw)
         combined = pd.concat([predicted, empirical], axis=1)
-        pearsonsr = compare_accuracies(lang, predicted, empirical)
+        pearsonsr = compare_accuracies(lang, combined["predicted"], combined["empirical"])
         visualize_correlation(lang, combined, pearsonsr)
-
-main(langs, mfw)
+    # Confidence intervals and p-values for all classifiers and mfw, as saved 
+    # by correlations.py (or computed here, without saving, if not saved yet)
+    if os.path.exists(correlations.correlationsfile): 
+        allcorrelations = correlations.load_correlations(correlations.correlationsfile)
+    else: 
+        allcorrelations = correlations.get_all_correlations(langs, correlations.classifiers, correlations.methods, correlations.replicates, correlations.seed)
+    selected = allcorrelations[allcorrelations["language"].isin(langs) 
+                               & (allcorrelations["classifier"] == "wurzburg") & (allcorrelations["mfw"] == mfw) 
+                               & (allcorrelations["method"] == "spearman")]
+    print(selected[["language", "r", "ci_lower", "ci_upper", "p"]].round(3).to_string(index=False))
+
+if __name__ == "__main__":
+    main(langs, mfw)
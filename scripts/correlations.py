@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Correlations ==
+
+Resampling engine for the comparison of predicted and empirical
+accuracies (see compare_accuracies.py).
+
+For each language, the predicted accuracy of each author (column
+"prediction" of hypotheses/<lang>_variability.tsv) is correlated with
+the empirical accuracy of the author (results/results_authors_acc_
+<classifier>.csv) for every classifier and every mfw column at once.
+Two correlations are computed: Pearson's r of the values and
+Spearman's rho (Pearson's r of the ranks, which is what
+compare_accuracies.py reports for a single setting).
+
+Uncertainty is estimated by resampling the authors, with all
+replicates done as batched array operations:
+- bootstrap: the authors are drawn with replacement (and re-ranked for
+  Spearman's rho); the percentile interval is the confidence interval.
+- permutation: the predicted accuracies are shuffled against the
+  empirical ones; the two-sided p-value is the share of replicates with
+  an absolute correlation at least as large as the observed one.
+
+Output: results/correlations.tsv, with one row per language,
+classifier, mfw and method.
+"""
+
+
+# === Import statements ===
+
+import warnings
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+import results_cube
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+correlationsfile = join(wdir, "results", "correlations.tsv")
+languages = ["deu", "eng", "fra", "hun", "nor", "por", "rom"]
+classifiers = ["delta", "eder", "wurzburg"]
+methods = ["pearson", "spearman"]
+replicates = 10000 # Number of bootstrap and permutation replicates each
+confidence = 0.95
+seed = 42
+batchsize = 500 # Number of bootstrap replicates computed at once
+
+
+# === Functions ===
+
+def read_predicted(lang):
+    variabilityfile = join(wdir, "hypotheses", lang+"_variability.tsv")
+    predicted = pd.read_csv(variabilityfile, sep="\t", index_col=0)
+    return predicted["prediction"]
+
+
+def get_ranks(values):
+    """
+    Ranks along the second to last axis (authors), with ties getting
+    their average rank (as in pandas' rank()).
+    """
+    column = values[...,:,None,:]
+    row = values[...,None,:,:]
+    lower = np.sum(row < column, axis=-2)
+    equal = np.sum(row == column, axis=-2)
+    return lower + (equal + 1) / 2
+
+
+def correlate(x, y):
+    """
+    Pearson's r between x (... x authors) and each column of y
+    (... x authors x settings). Returns NaN for constant vectors.
+    """
+    x = x - np.mean(x, axis=-1, keepdims=True)
+    y = y - np.mean(y, axis=-2, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.einsum("...n,...nm->...m", x, y) / np.sqrt(np.sum(x**2, axis=-1)[...,None] * np.sum(y**2, axis=-2))
+
+
+def transform(x, y, method):
+    if method == "spearman":
+        return get_ranks(x[...,None])[...,0], get_ranks(y)
+    return x, y
+
+
+def bootstrap(x, y, method, replicates, rng):
+    """
+    Correlations for replicates x settings resamples of the authors.
+    """
+    results = []
+    for start in range(0, replicates, batchsize):
+        samples = rng.integers(0, len(x), (min(batchsize, replicates-start), len(x)))
+        results.append(correlate(*transform(x[samples], y[samples], method)))
+    return np.concatenate(results)
+
+
+def permute(x, y, method, replicates, rng):
+    """
+    Correlations for replicates x settings shuffles of x against y.
+    """
+    x, y = transform(x, y, method)
+    shuffles = rng.permuted(np.tile(x, (replicates, 1)), axis=1)
+    return correlate(shuffles, y)
+
+
+def get_correlations(lang, classifiers, methods, replicates, seed):
+    """
+    Observed correlations, confidence intervals and p-values of one
+    language for all classifiers, mfw settings and methods.
+    """
+    rng = np.random.default_rng(seed)
+    predicted = read_predicted(lang)
+    cube = results_cube.load_cube(join(wdir, "results", ""))
+    alpha = (1 - confidence) / 2
+    rows = []
+    for classifier in classifiers:
+        empirical = results_cube.select(cube, "authors_acc", classifier, lang).dropna()
+        authors = [author for author in predicted.index if author in empirical.index]
+        x = predicted[authors].to_numpy(dtype=float)
+        y = empirical.loc[authors].to_numpy(dtype=float)
+        for method in methods:
+            observed = correlate(*transform(x, y, method))
+            booted = bootstrap(x, y, method, replicates, rng)
+            permuted = permute(x, y, method, replicates, rng)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning) # Constant accuracies give NaN only
+                lower, upper = np.nanquantile(booted, [alpha, 1-alpha], axis=0)
+            pvalues = (1 + np.sum(np.abs(permuted) >= np.abs(observed) - 1e-12, axis=0)) / (replicates + 1)
+            pvalues[np.isnan(observed)] = np.nan
+            for i, mfw in enumerate(empirical.columns):
+                rows.append({"language" : lang, "classifier" : classifier, "mfw" : mfw,
+                             "method" : method, "authors" : len(authors), "r" : observed[i],
+                             "ci_lower" : lower[i], "ci_upper" : upper[i], "p" : pvalues[i]})
+    return pd.DataFrame(rows)
+
+
+def get_all_correlations(languages, classifiers, methods, replicates, seed):
+    """
+    Correlations of all languages in one frame (without saving them).
+    """
+    return pd.concat([get_correlations(lang, classifiers, methods, replicates, seed) for lang in languages],
+                     ignore_index=True)
+
+
+def load_correlations(correlationsfile):
+    return pd.read_csv(correlationsfile, sep="\t")
+
+
+def save_correlations(correlations, correlationsfile):
+    with open(correlationsfile, "w", encoding="utf8") as outfile:
+        correlations.to_csv(outfile, sep="\t", index=None)
+
+
+# === Main ===
+
+def main(languages, classifiers, methods, replicates, seed):
+    correlations = get_all_correlations(languages, classifiers, methods, replicates, seed)
+    save_correlations(correlations, correlationsfile)
+    return correlations
+
+
+if __name__ == "__main__":
+    main(languages, classifiers, methods, replicates, seed)
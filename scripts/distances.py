@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Distances ==
+
+Batched distance kernels for the Delta classifiers (see stylometry.py).
+
+Instead of computing the distances between each test document and the
+training documents fold by fold, the full matrix of pairwise distances
+between all documents of a language is computed once per classifier and
+mfw setting. Any cross-validation scheme is then applied by masking the
+pairs of documents that are in the same fold (for leave-one-out, the
+diagonal) and taking the nearest neighbour in each row.
+
+- delta: mean absolute difference of the z-scores (Burrows)
+- eder: absolute differences weighted by (n-i)/n for the i-th word (Eder)
+- wurzburg: 1 - cosine similarity, as one matrix product (Wurzburg)
+
+For a sweep over several mfw settings, get_sweep() makes a single pass
+over the words: both distances are sums over the words, so the sums
+for the first mfw words are carried over to the next setting and only
+the columns in between are added. Eder's weights depend on the number
+of words n, but sum((n-i)/n * d_i) = sum(d_i) - sum(i * d_i) / n, so
+the two prefix sums of d_i and i * d_i are enough for any n.
+"""
+
+
+# === Import statements ===
+
+import numpy as np
+
+
+# === Functions ===
+
+def get_weights(classifier, n):
+    """
+    Weights of the absolute differences for the Manhattan-type distances.
+    """
+    if classifier == "delta":
+        return np.full(n, 1 / n)
+    if classifier == "eder":
+        return (n - np.arange(n)) / n
+    raise ValueError("Unknown classifier: " + classifier)
+
+
+def get_manhattan(zscores, weights):
+    """
+    Weighted Manhattan distances between all rows of zscores (with
+    weights of shape words x k, k sums per pair of rows). As the
+    matrix is symmetric, only the pairs above the diagonal are computed,
+    one row at a time, and mirrored.
+    """
+    n = zscores.shape[0]
+    matrix = np.zeros((n, n) + weights.shape[1:])
+    for i in range(n-1):
+        matrix[i,i+1:] = np.abs(zscores[i+1:] - zscores[i]) @ weights
+    return matrix + np.swapaxes(matrix, 0, 1)
+
+
+def get_cosine(zscores):
+    """
+    Cosine distances between all rows of zscores.
+    """
+    normed = zscores / np.linalg.norm(zscores, axis=1)[:,None]
+    return 1 - normed @ normed.T
+
+
+def get_matrix(zscores, classifier, mfw):
+    """
+    Pairwise distances between all documents, using the first mfw words.
+    """
+    zscores = np.asarray(zscores[:,:mfw], dtype=np.float64)
+    if classifier == "wurzburg":
+        return get_cosine(zscores)
+    return get_manhattan(zscores, get_weights(classifier, zscores.shape[1]))
+
+
+def get_nearest(matrix, assignment):
+    """
+    Index of the nearest document in another fold, for each document.
+    """
+    masked = np.where(assignment[:,None] == assignment[None,:], np.inf, matrix)
+    return np.argmin(masked, axis=1)
+
+
+def get_sweep(zscores, classifier, mfws):
+    """
+    Yield the pairwise distances for each mfw setting (in increasing
+    order), from prefix sums over the words. Settings above the number
+    of words use all words (as in get_matrix).
+    """
+    zscores = np.asarray(zscores, dtype=np.float64)
+    n = zscores.shape[0]
+    sums = np.zeros((n, n, 2))
+    previous = 0
+    for mfw in sorted(mfws):
+        words = min(mfw, zscores.shape[1])
+        block = zscores[:,previous:words]
+        if classifier == "wurzburg":
+            sums[:,:,0] += block @ block.T
+            norms = np.sqrt(np.diag(sums[:,:,0]))
+            yield mfw, 1 - sums[:,:,0] / np.outer(norms, norms)
+        else:
+            positions = np.arange(previous, words)
+            sums += get_manhattan(block, np.stack([np.ones(len(positions)), positions], axis=1))
+            if classifier == "delta":
+                yield mfw, sums[:,:,0] / words
+            elif classifier == "eder":
+                yield mfw, sums[:,:,0] - sums[:,:,1] / words
+            else:
+                raise ValueError("Unknown classifier: " + classifier)
+        previous = words
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Experiments ==
+
+Scheduler for the attribution experiments of roadmap step 7:
+language x classifier x mfw x cross-validation fold.
+
+The grid below is expanded into cells, which are run in a pool of
+processes (one task per language and classifier, sweeping over the
+mfw settings). Each cell is passed back by its worker as soon as it is
+finished and appended to the results store (results/experiments.tsv),
+with one row per author:
+
+    cv, language, features, author, classifier, mfw, fold, tested, correct, predicted
+
+where features is a fingerprint of the documents and words of the
+feature store the cell was run on (see features.py), tested is the
+number of the author's novels in the test fold, correct the number of
+them attributed to the author and predicted the number of test novels
+(by anyone) attributed to the author. Cells run on an older feature
+store of a language are not counted as done and are left out of the
+views, as are folds that are not in the current assignment. The store
+is only ever appended to, with one write per cell; when the script is
+run again, cells that are complete in the store (with as many tested
+novels as there are in the fold) are skipped, so an interrupted run
+resumes where it stopped. The rows of a cell cut off by an interrupted
+run are written again and only the last copy of each row is used.
+
+The wide tables (results_overall_*, results_authors_acc_*,
+results_authors_f1_*) are then generated from the store as views.
+"""
+
+
+# === Import statements ===
+
+import os
+import io
+import csv
+from os.path import join
+from functools import lru_cache
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import features
+import manifest
+import stylometry
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+storefile = join(wdir, "results", "experiments.tsv")
+resultsdir = join(wdir, "results", "python", "")
+workers = 4 # Number of parallel processes (1 = no parallelization)
+
+grid = {"languages" : ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"],
+        "classifiers" : ["delta", "eder", "wurzburg"],
+        "mfws" : list(range(100, 2001, 20)),
+        "folds" : None, # Number of folds, or None for leave-one-out
+        "seed" : 42} # For the assignment of documents to folds
+
+columns = ["cv", "language", "features", "author", "classifier", "mfw", "fold", "tested", "correct", "predicted"]
+
+
+# === Functions ===
+
+def get_cv(grid):
+    """
+    Name of the cross-validation scheme, recorded with each row.
+    """
+    if grid["folds"] is None:
+        return "loo"
+    return str(grid["folds"]) + "fold-" + str(grid["seed"])
+
+
+@lru_cache(maxsize=None)
+def load_language(lang, folds, seed):
+    """
+    Load the author labels, z-scores and fold assignment of one
+    language, once per process, with the fingerprint of its documents
+    and words.
+    """
+    filenames, labels, words, freqs = features.load_features(lang)
+    fingerprint = manifest.get_fingerprint(filenames, labels, words)
+    zscores = features.get_zscores(freqs)
+    assignment = stylometry.get_folds(labels, folds, seed)
+    return np.array(labels), zscores, assignment, fingerprint
+
+
+def load_done(storefile):
+    """
+    Return the cells in the store with their number of tested novels.
+    """
+    if not os.path.exists(storefile):
+        return {}
+    store = read_store(storefile)
+    tested = store.groupby(["cv", "language", "features", "classifier", "mfw", "fold"])["tested"].sum()
+    return tested.to_dict()
+
+
+def read_store(storefile):
+    """
+    Read the store, with only the last copy of each row.
+    """
+    store = pd.read_csv(storefile, sep="\t", keep_default_na=False)
+    return store.drop_duplicates(["cv", "language", "features", "author", "classifier", "mfw", "fold"], keep="last")
+
+
+def expand_grid(grid, done):
+    """
+    Expand the grid into tasks, one per language and classifier, each
+    with the mfw settings and folds that are not yet complete in the store.
+    """
+    cv = get_cv(grid)
+    tasks = []
+    for lang in grid["languages"]:
+        labels, zscores, assignment, fingerprint = load_language(lang, grid["folds"], grid["seed"])
+        for classifier in grid["classifiers"]:
+            pending = {}
+            for mfw in grid["mfws"]:
+                folds = [fold for fold in sorted(set(assignment))
+                         if done.get((cv, lang, fingerprint, classifier, mfw, fold)) != np.sum(assignment == fold)]
+                if len(folds) > 0:
+                    pending[mfw] = folds
+            if len(pending) > 0:
+                tasks.append((lang, classifier, pending))
+    return tasks
+
+
+def run_task(lang, classifier, pending, grid):
+    """
+    Run the cells of one task, sweeping over its mfw settings in one
+    pass (see stylometry.sweep), and yield the store rows of each cell
+    as soon as it is done.
+    """
+    cv = get_cv(grid)
+    labels, zscores, assignment, fingerprint = load_language(lang, grid["folds"], grid["seed"])
+    for mfw, attributions in stylometry.sweep(zscores, labels, classifier, list(pending), assignment):
+        for fold in pending[mfw]:
+            test = np.flatnonzero(assignment == fold)
+            predictions = attributions[test]
+            rows = []
+            for author in sorted(set(labels[test]) | set(predictions)):
+                tested = int(np.sum(labels[test] == author))
+                correct = int(np.sum((labels[test] == author) & (predictions == author)))
+                predicted = int(np.sum(predictions == author))
+                rows.append([cv, lang, fingerprint, author, classifier, mfw, int(fold), tested, correct, predicted])
+            yield rows
+
+
+def queue_task(queue, lang, classifier, pending, grid):
+    """
+    Run one task in a worker process, passing the rows of each cell to
+    the main process through the queue. None marks the end of the task,
+    also if it fails.
+    """
+    try:
+        for rows in run_task(lang, classifier, pending, grid):
+            queue.put(rows)
+    finally:
+        queue.put(None)
+
+
+def open_store(storefile):
+    """
+    Open the store for appending, writing the header to a new store.
+    A last line cut off by an interrupted run is removed.
+    """
+    new = not os.path.exists(storefile)
+    if not new:
+        with open(storefile, "rb+") as infile:
+            content = infile.read()
+            if not content.endswith(b"\n"):
+                infile.truncate(content.rfind(b"\n") + 1)
+    outfile = open(storefile, "a", encoding="utf8", newline="")
+    if new:
+        csv.writer(outfile, delimiter="\t").writerow(columns)
+        outfile.flush()
+    return outfile
+
+
+def append_rows(rows, outfile):
+    """
+    Append the rows of a finished cell to the store, in one write.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter="\t").writerows(rows)
+    outfile.write(buffer.getvalue())
+    outfile.flush()
+
+
+def make_views(storefile, grid, resultsdir):
+    """
+    Aggregate the store over the folds and save the wide tables, with
+    only the rows of the current feature store and folds of each language.
+    """
+    if not os.path.exists(resultsdir):
+        os.makedirs(resultsdir)
+    store = read_store(storefile)
+    current = []
+    for lang in grid["languages"]:
+        labels, zscores, assignment, fingerprint = load_language(lang, grid["folds"], grid["seed"])
+        current.append((store["language"] == lang) & (store["features"] == fingerprint)
+                       & store["fold"].isin(set(assignment.tolist())))
+    store = store[(store["cv"] == get_cv(grid)) & np.logical_or.reduce(current)]
+    for classifier in grid["classifiers"]:
+        selected = store[store["classifier"] == classifier]
+        authors = selected.groupby(["language", "author", "mfw"])[["tested", "correct", "predicted"]].sum()
+        authors["acc"] = authors["correct"] / authors["tested"]
+        authors["f1"] = 2 * authors["correct"] / (authors["tested"] + authors["predicted"])
+        overall = selected.groupby(["language", "mfw"])[["tested", "correct"]].sum()
+        overall["acc"] = overall["correct"] / overall["tested"]
+        tables = {"overall" : {}, "authors_acc" : {}, "authors_f1" : {}}
+        for (lang, mfw), row in overall.iterrows():
+            tables["overall"].setdefault(lang, {})[mfw] = row["acc"]
+        for (lang, author, mfw), row in authors[authors["tested"] > 0].iterrows():
+            tables["authors_acc"].setdefault(lang + "_" + author, {})[mfw] = row["acc"]
+            tables["authors_f1"].setdefault(lang + "_" + author, {})[mfw] = row["f1"]
+        for name, table in tables.items():
+            stylometry.save_table(table, grid["mfws"], join(resultsdir, "results_" + name + "_" + classifier + ".csv"))
+
+
+# === Main ===
+
+def main(grid, storefile, resultsdir, workers):
+    for lang in grid["languages"]:
+        features.get_features(lang, max(grid["mfws"]))
+    with open_store(storefile) as outfile:
+        tasks = expand_grid(grid, load_done(storefile))
+        print(len(tasks), "tasks with", sum([len(folds) for task in tasks for folds in task[2].values()]), "cells to run")
+        if workers > 1:
+            with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+                queue = manager.Queue()
+                futures = [executor.submit(queue_task, queue, *task, grid) for task in tasks]
+                finished = 0
+                while finished < len(futures):
+                    rows = queue.get()
+                    if rows is None:
+                        finished += 1
+                    else:
+                        append_rows(rows, outfile)
+                for future in futures:
+                    future.result() # Raise the errors of failed tasks
+        else:
+            for task in tasks:
+                for rows in run_task(*task, grid):
+                    append_rows(rows, outfile)
+    make_views(storefile, grid, resultsdir)
+
+
+if __name__ == "__main__":
+    main(grid, storefile, resultsdir, workers)
@@ -36,8 +36,8 @@ import glob
 from os.path import join
 from os.path import basename
 import pandas as pd
-from lxml import etree
-from collections import Counter
+
+import header_cache
 
 
 # === Files and folders ===
@@ -69,53 +69,42 @@ ordering = ["filename", "xmlid", "authorlabel", "au-name", "title", "au-birth",
 
 sorting = ["authorlabel", True] # column, ascending?
 
+workers = 4 # Number of parallel processes (1 = no parallelization)
 
-# === Functions ===
+authorxpath = "//tei:titleStmt/tei:author/text()"
 
+editions = [" : ELTeC edition", " : édition ELTeC", " : edition ELTeC",
+            " : ELTeC ausgabe", " : ELTeC kiadás", " ELTeC-utgaven",
+            ": ediție ELTeC", ": Edição para o ELTeC", ": edição para o ELTeC"]
+editions = re.compile("|".join([re.escape(edition) for edition in editions]))
 
-def open_file(teiFile): 
-    """
-    Open and parse the XML file. 
-    Returns an XML tree.
-    """
-    with open(teiFile, "r", encoding="utf8") as infile:
-        xml = etree.parse(infile)
-        return xml
 
+# === Functions ===
 
 
-def get_metadatum(xml, xpath): 
+def get_metadatum(metadatum): 
     """
-    For each metadata key and XPath defined above, retrieve the 
-    metadata item from the XML tree.
+    Clean up one metadata item, as retrieved with the XPaths 
+    defined above (None if there is no such item). 
     Note that the individual identifers for au-ids and title-ids 
     are not split into individual columns.
+    The " : ELTeC edition" suffixes of all languages are removed 
+    in one go, then the whitespace is cleaned up.
     """
-    try: 
-        namespaces = {'tei':'http://www.tei-c.org/ns/1.0',
-                      'eltec':'http://distantreading.net/eltec/ns'}       
-        metadatum = xml.xpath(xpath, namespaces=namespaces)[0]
-    except: 
+    if metadatum is None: 
         metadatum = "NA"
-    metadatum = re.sub(" : ELTeC edition", "", metadatum)
-    metadatum = re.sub(" : édition ELTeC", "", metadatum)
-    metadatum = re.sub(" : edition ELTeC", "", metadatum)
-    metadatum = re.sub(" : ELTeC ausgabe", "", metadatum)
-    metadatum = re.sub(" : ELTeC kiadás", "", metadatum)
-    metadatum = re.sub(" ELTeC-utgaven", "", metadatum)    
-    metadatum = re.sub(": ediție ELTeC", "", metadatum)    
-    metadatum = re.sub(": Edição para o ELTeC", "", metadatum)    
-    metadatum = re.sub(": edição para o ELTeC", "", metadatum)    
-    metadatum = re.sub("     ", "", metadatum)
-    metadatum = re.sub("    ", "", metadatum)
-    metadatum = re.sub("^ ", "", metadatum)
-    metadatum = re.sub("\n", "", metadatum)
+    metadatum = editions.sub("", metadatum)
+    metadatum = metadatum.replace("     ", "")
+    metadatum = metadatum.replace("    ", "")
+    if metadatum.startswith(" "): 
+        metadatum = metadatum[1:]
+    metadatum = metadatum.replace("\n", "")
     return metadatum
 
 
-def get_authordata(xml): 
+def get_authordata(authordata): 
     """
-    Retrieve the author field and split it into constituent parts.
+    Split the author field into constituent parts.
     Expected pattern: "name (alternatename) (birth-death)"
     where birth and death are both four-digit years. 
     The alternate name is ignored. 
@@ -123,9 +112,6 @@ def get_authordata(xml):
     entries, as this is not always a trivial decision to make.
     """
     try: 
-        namespaces = {'tei':'http://www.tei-c.org/ns/1.0'}       
-        authordata = xml.xpath("//tei:titleStmt/tei:author/text()",
-                               namespaces=namespaces)[0]
         authordata = re.sub("\n", "", authordata)
         name = re.search("(.*?) \(", authordata).group(1)
         name = re.sub("^ ", "", name)
@@ -141,14 +127,55 @@ def get_authordata(xml):
 
 
 
+def get_headerxpaths(xpaths): 
+    """
+    All XPaths to retrieve from the header: the author field 
+    and the metadata items defined in the xpaths dictionary. 
+    """
+    return dict(xpaths, authordata=authorxpath)
+
+
+
+def get_row(fields, filename, xpaths): 
+    """
+    Build one row of the metadata table as a dictionary from 
+    the retrieved header fields (see header_cache.py). 
+    """
+    keys = []
+    metadata = []
+    keys.append("filename")
+    metadata.append(filename)
+    name,birth,death,authorlabel = get_authordata(fields["authordata"])
+    keys.extend(["au-name", "au-birth", "au-death", "authorlabel"])
+    metadata.extend([name, birth, death,authorlabel])
+    for key in xpaths: 
+        metadatum = get_metadatum(fields[key])
+        keys.append(key)
+        metadata.append(metadatum)
+    return dict(zip(keys, metadata))
+
+
+
+def get_metadata(xml, filename, xpaths): 
+    """
+    Collect the author data and all metadata items defined 
+    in the xpaths dictionary for one (already parsed) XML tree.
+    Returns one row of the metadata table as a dictionary.
+    """
+    return get_row(header_cache.get_raw(xml, get_headerxpaths(xpaths)), filename, xpaths)
+
+
+
 def save_metadata(metadata, metadatafile, ordering, sorting): 
     """
     Save all metadata to a CSV file. 
     The ordering of the columns follows the list defined above.
+    Rows with the same value in the sorting column are sorted by 
+    filename, so that the order does not depend on the input order.
     """
     metadata = pd.DataFrame(metadata)
     metadata = metadata[ordering]
-    metadata = metadata.sort_values(by=sorting[0], ascending=sorting[1])
+    metadata = metadata.sort_values(by=list(dict.fromkeys([sorting[0], "filename"])), ascending=sorting[1])
     print(metadatafile)
     with open(join(metadatafile), "w", encoding="utf8") as outfile: 
         metadata.to_csv(outfile, sep="\t", index=None)
@@ -156,40 +183,35 @@ def save_metadata(metadata, metadatafile, ordering, sorting):
 
 # === Coordinating function ===
 
-def main(collection, level, xpaths, ordering, sorting):
+def main(collections, xpaths, ordering, sorting, workers):
     """
     From a collection of ELTeC XML-TEI files,
     create a CSV file with some metadata about each file.
+    The header fields of all collections are looked up in one go 
+    in the header cache; only new or changed files are parsed 
+    (in parallel).
     """
+    teiFiles = {}
+    for collection in collections: 
+        teiFolder = join("..", "originals", collection, "*.xml")
+        teiFiles[collection] = [teiFile for teiFile in glob.glob(teiFolder) if "schemas" not in basename(teiFile)]
+    allFiles = [teiFile for collection in collections for teiFile in teiFiles[collection]]
+    allFields = header_cache.get_fields(allFiles, get_headerxpaths(xpaths), workers=workers)
+    rows = {}
+    for teiFile in allFiles: 
+        filename,ext = basename(teiFile).split(".")
+        try: 
+            rows[teiFile] = get_row(allFields[teiFile], filename, xpaths)
+        except: 
+            print("ERROR!!!", filename)
+            rows[teiFile] = None
     for collection in collections: 
         print("\n====== " + collection + " ======") 		
-        workingDir = join("..", "originals", collection)
-        teiFolder = join(workingDir, "*.xml")
         metadatafile = join("..", "metadata", collection+"_metadata.tsv")
-        allmetadata = []
-        counter = 0
-        for teiFile in glob.glob(teiFolder): 
-            filename,ext = basename(teiFile).split(".")
-            #print(filename)
-            try: 
-                if "schemas" not in filename:
-                    counter +=1
-                    keys = []
-                    metadata = []
-                    keys.append("filename")
-                    metadata.append(filename)
-                    xml = open_file(teiFile)
-                    name,birth,death,authorlabel = get_authordata(xml)
-                    keys.extend(["au-name", "au-birth", "au-death", "authorlabel"])
-                    metadata.extend([name, birth, death,authorlabel])
-                    for key,xpath in xpaths.items(): 
-                        metadatum = get_metadatum(xml, xpath)
-                        keys.append(key)
-                        metadata.append(metadatum)
-                    allmetadata.append(dict(zip(keys, metadata)))
-            except: 
-                print("ERROR!!!", filename)
-        print("FILES:", counter)
+        allmetadata = [rows[teiFile] for teiFile in teiFiles[collection] if rows[teiFile] is not None]
+        print("FILES:", len(teiFiles[collection]))
         save_metadata(allmetadata, metadatafile, ordering, sorting)
-    
-main(collections, level, xpaths, ordering, sorting)
+
+
+if __name__ == "__main__":
+    main(collections, xpaths, ordering, sorting, workers)
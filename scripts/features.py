@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Features ==
+
+Shared feature store for the attribution experiments.
+
+For each language, the relative frequencies of the N most frequent
+words (ranked by their frequency in the whole collection) are computed
+once from the token store of plaintxt/<lang>/ (see token_store.py)
+and saved in features/:
+
+- <lang>_freqs.npy: float32 matrix, documents x words
+- <lang>_words.txt: the words, one per line, in rank order
+- <lang>_docs.tsv: file name and author label of each document (row)
+- <lang>_settings.json: the number of words requested (the store may
+  have fewer words, if the collection has fewer)
+
+The matrix is loaded memory-mapped, so any number of most frequent
+words can be sliced from it (freqs[:,:mfw]) without copying. As each
+column is standardized on its own, the z-scores of a slice are the
+first columns of the z-scores of the whole matrix.
+"""
+
+
+# === Import statements ===
+
+import os
+import json
+import glob
+from os.path import join, basename, getmtime
+
+import numpy as np
+import pandas as pd
+
+import token_store
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+featuresdir = join(wdir, "features", "")
+languages = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+features = 2000 # Number of most frequent words to store
+workers = 4 # Number of parallel processes (1 = no parallelization)
+
+
+# === Functions ===
+
+def read_authors(lang):
+    """
+    Return the author label of each file in the metadata table.
+    """
+    metadatafile = join(wdir, "metadata", lang+"_metadata.tsv")
+    metadata = pd.read_csv(metadatafile, sep="\t", dtype=str, keep_default_na=False)
+    return dict(zip(metadata["filename"], metadata["authorlabel"]))
+
+
+def get_documents(lang):
+    """
+    Return the file names and author labels of the plain texts that
+    are listed in the metadata table (the rows of the feature matrix).
+    """
+    authors = read_authors(lang)
+    txtfiles = sorted(glob.glob(join(wdir, "plaintxt", lang, "*.txt")))
+    filenames = [basename(txtfile)[:-4] for txtfile in txtfiles if basename(txtfile)[:-4] in authors]
+    return filenames, [authors[filename] for filename in filenames]
+
+
+def read_corpus(lang, workers=1):
+    """
+    Get the token ids of the plain texts of one language from the token
+    store (see token_store.py) and their author labels. Only texts
+    listed in the metadata table are used. Returns the file names,
+    author labels, the words of the store and the token ids of each text.
+    """
+    authors = read_authors(lang)
+    stored, offsets, words, totals, ids = token_store.get_store(lang, workers)
+    selected = [i for i, filename in enumerate(stored) if filename in authors]
+    filenames = [stored[i] for i in selected]
+    labels = [authors[filename] for filename in filenames]
+    documents = [ids[offsets[i]:offsets[i+1]] for i in selected]
+    return filenames, labels, words, documents
+
+
+def get_counts(words, documents, features):
+    """
+    Count the most frequent words in the documents, ranked by their
+    overall frequency (ties broken alphabetically). Returns the words
+    and the matrix of absolute frequencies (documents x words).
+    """
+    total = np.zeros(len(words), dtype=np.int64)
+    for document in documents:
+        total += np.bincount(document, minlength=len(words))
+    ranked = sorted(np.flatnonzero(total), key=lambda i: (-total[i], words[i]))[:features]
+    counts = np.array([np.bincount(document, minlength=len(words))[ranked] for document in documents], dtype=np.int64)
+    return [words[i] for i in ranked], counts.reshape(len(documents), len(ranked))
+
+
+def get_freqs(words, documents, features):
+    """
+    Build the matrix of relative frequencies (documents x words) for the
+    most frequent words in the documents (see get_counts).
+    """
+    words, counts = get_counts(words, documents, features)
+    freqs = counts / np.array([len(document) for document in documents], dtype=np.float64)[:,None]
+    return words, freqs
+
+
+def get_filenames(lang):
+    return {"freqs" : join(featuresdir, lang+"_freqs.npy"),
+            "words" : join(featuresdir, lang+"_words.txt"),
+            "docs" : join(featuresdir, lang+"_docs.tsv"),
+            "settings" : join(featuresdir, lang+"_settings.json")}
+
+
+def is_current(lang, features):
+    """
+    Check whether the stored features exist, were built for at least as
+    many words as needed and for the same documents, and are newer than
+    the plain texts and the metadata table.
+    """
+    filenames = get_filenames(lang)
+    if not all([os.path.exists(filename) for filename in filenames.values()]):
+        return False
+    sources = glob.glob(join(wdir, "plaintxt", lang, "*.txt")) + [join(wdir, "metadata", lang+"_metadata.tsv")]
+    if max([getmtime(source) for source in sources]) > getmtime(filenames["freqs"]):
+        return False
+    with open(filenames["settings"], "r", encoding="utf8") as infile:
+        settings = json.load(infile)
+    with open(filenames["docs"], "r", encoding="utf8") as infile:
+        docs = [line.split("\t") for line in infile.read().splitlines()]
+    documents = [[filename, label] for filename, label in zip(*get_documents(lang))]
+    return settings["features"] >= features and docs == documents
+
+
+def save_features(lang, filenames, labels, words, freqs, features):
+    if not os.path.exists(featuresdir):
+        os.makedirs(featuresdir)
+    paths = get_filenames(lang)
+    np.save(paths["freqs"], freqs.astype(np.float32))
+    with open(paths["words"], "w", encoding="utf8") as outfile:
+        outfile.write("\n".join(words) + "\n")
+    with open(paths["docs"], "w", encoding="utf8") as outfile:
+        for filename, label in zip(filenames, labels):
+            outfile.write(filename + "\t" + label + "\n")
+    with open(paths["settings"], "w", encoding="utf8") as outfile:
+        json.dump({"features" : features}, outfile)
+
+
+def build_features(lang, features, workers=1):
+    print("Building features for", lang)
+    filenames, labels, words, documents = read_corpus(lang, workers)
+    words, freqs = get_freqs(words, documents, features)
+    save_features(lang, filenames, labels, words, freqs, features)
+
+
+def load_features(lang):
+    """
+    Load the stored features of one language; the frequency matrix is
+    memory-mapped (read-only).
+    """
+    paths = get_filenames(lang)
+    freqs = np.load(paths["freqs"], mmap_mode="r")
+    with open(paths["words"], "r", encoding="utf8") as infile:
+        words = infile.read().splitlines()
+    with open(paths["docs"], "r", encoding="utf8") as infile:
+        docs = [line.split("\t") for line in infile.read().splitlines()]
+    filenames = [doc[0] for doc in docs]
+    labels = [doc[1] for doc in docs]
+    return filenames, labels, words, freqs
+
+
+def get_features(lang, features=features):
+    """
+    Return file names, author labels, words and the (memory-mapped)
+    frequency matrix, building the store first if needed.
+    """
+    if not is_current(lang, features):
+        build_features(lang, features)
+    return load_features(lang)
+
+
+def get_zscores(freqs):
+    """
+    Standardize each word's frequencies over all documents.
+    The z-scores of freqs[:,:mfw] are get_zscores(freqs)[:,:mfw].
+    """
+    freqs = np.asarray(freqs, dtype=np.float64)
+    means = np.mean(freqs, axis=0)
+    stds = np.std(freqs, axis=0, ddof=1)
+    stds[stds == 0] = 1
+    return (freqs - means) / stds
+
+
+# === Main ===
+
+def main(languages, features, workers):
+    for lang in languages:
+        build_features(lang, features, workers)
+
+
+if __name__ == "__main__":
+    main(languages, features, workers)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Header cache ==
+
+On-disk cache of the fields that the scripts read from the teiHeader
+of the XML-TEI files (xml:id, author, title, ...), so that each file
+is parsed again only when it has changed.
+
+The cache is an SQLite database (metadata/header_cache.sqlite) with
+one row per file and set of XPaths: the absolute path of the file, a
+fingerprint of the XPaths (so that scripts with different XPaths do
+not invalidate each other's rows), the size, modification time and
+SHA-1 hash of the file, and the fields as JSON. For each XPath, the
+raw value of the first result is stored (or null if there is none);
+any cleaning is left to the scripts.
+
+A row is current if the file has the same size and modification time;
+if only the modification time changed (e.g. after a checkout), the
+hash is compared before the file is parsed again. get_fields() looks
+up any number of files in one go and returns their fields.
+"""
+
+
+# === Import statements ===
+
+import os
+import json
+import sqlite3
+from os.path import join
+from contextlib import closing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from lxml import etree
+
+import xml_utils
+import manifest
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+cachefile = join(wdir, "metadata", "header_cache.sqlite")
+batchsize = 500 # Number of files per query
+
+namespaces = {'tei':'http://www.tei-c.org/ns/1.0',
+              'eltec':'http://distantreading.net/eltec/ns'}
+
+
+# === Functions ===
+
+@lru_cache(maxsize=None)
+def get_xpath(xpath):
+    """
+    Compile an XPath expression once, with the namespaces bound.
+    """
+    return etree.XPath(xpath, namespaces=namespaces)
+
+
+def get_raw(xml, xpaths):
+    """
+    Return the first result of each XPath on a parsed tree (or None).
+    """
+    fields = {}
+    for key, xpath in xpaths.items():
+        results = get_xpath(xpath)(xml)
+        fields[key] = str(results[0]) if len(results) > 0 else None
+    return fields
+
+
+def read_file(teifile, xpaths):
+    """
+    Parse the header of one file and return its fields and hash,
+    or None if the file cannot be read or parsed.
+    """
+    try:
+        return get_raw(xml_utils.read_header(teifile), xpaths), manifest.get_hash(teifile)
+    except (etree.XMLSyntaxError, OSError):
+        print("ERROR!!!", teifile)
+        return None
+
+
+def connect(cachefile):
+    connection = sqlite3.connect(cachefile, timeout=60)
+    connection.execute("CREATE TABLE IF NOT EXISTS headers (path TEXT, fingerprint TEXT, size INTEGER, "
+                       "mtime INTEGER, hash TEXT, fields TEXT, PRIMARY KEY (path, fingerprint))")
+    return connection
+
+
+def lookup(connection, paths, fingerprint):
+    """
+    Return the cached rows for the given paths: {path : (size, mtime, hash, fields)}.
+    """
+    rows = {}
+    for start in range(0, len(paths), batchsize):
+        batch = paths[start:start+batchsize]
+        query = ("SELECT path, size, mtime, hash, fields FROM headers WHERE fingerprint = ? AND path IN ("
+                 + ",".join(["?"] * len(batch)) + ")")
+        for path, size, mtime, filehash, fields in connection.execute(query, [fingerprint] + batch):
+            rows[path] = (size, mtime, filehash, fields)
+    return rows
+
+
+def get_fields(teifiles, xpaths, cachefile=cachefile, workers=1):
+    """
+    Return the header fields of each file, {teifile : {key : value}}
+    (None for files that cannot be read or parsed). Only files that are
+    not in the cache or have changed are parsed (in parallel if
+    workers > 1). The connection is closed in any case.
+    """
+    fingerprint = manifest.get_fingerprint(xpaths)
+    paths = [os.path.abspath(teifile) for teifile in teifiles]
+    with closing(connect(cachefile)) as connection, connection:
+        cached = lookup(connection, paths, fingerprint)
+        fields = {}
+        touched = []
+        stale = []
+        for teifile, path in zip(teifiles, paths):
+            row = cached.get(path)
+            try:
+                stat = os.stat(teifile)
+                current = row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns
+                touch = not current and row is not None and row[0] == stat.st_size and row[2] == manifest.get_hash(teifile)
+            except OSError:
+                # Files that cannot be read are reported like files that cannot be parsed
+                print("ERROR!!!", teifile)
+                fields[teifile] = None
+                continue
+            if current or touch:
+                fields[teifile] = json.loads(row[3])
+            else:
+                stale.append((teifile, path, stat))
+            if touch:
+                touched.append((stat.st_mtime_ns, path, fingerprint))
+        if workers > 1 and len(stale) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(read_file, [item[0] for item in stale], repeat(xpaths)))
+        else:
+            results = [read_file(item[0], xpaths) for item in stale]
+        updates = []
+        for (teifile, path, stat), result in zip(stale, results):
+            if result is None:
+                fields[teifile] = None
+                continue
+            fields[teifile], filehash = result
+            updates.append((path, fingerprint, stat.st_size, stat.st_mtime_ns, filehash,
+                            json.dumps(fields[teifile], ensure_ascii=False)))
+        connection.executemany("UPDATE headers SET mtime = ? WHERE path = ? AND fingerprint = ?", touched)
+        connection.executemany("INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?, ?, ?)", updates)
+    return {teifile : fields[teifile] for teifile in teifiles}
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helper functions for incremental corpus builds.
+
+The build manifest is a JSON file that records, for each XML-TEI file,
+the hash of its content and any per-file results that need to be
+merged back later (such as word counts), together with a fingerprint
+of the parameters each collection was built with. A file needs to be
+processed again if it is new, if its content changed, or if the
+parameters changed since its collection was last built.
+"""
+
+
+# === Import statements ===
+
+import os
+import json
+import hashlib
+
+
+# === Functions ===
+
+def get_hash(filename):
+    """
+    Return the SHA-1 hash of the file content.
+    """
+    sha = hashlib.sha1()
+    with open(filename, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1048576), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_fingerprint(*settings):
+    """
+    Return a hash of any number of JSON-serializable settings,
+    for example the params and xpaths dictionaries.
+    """
+    settings = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(settings.encode("utf8")).hexdigest()
+
+
+def load_manifest(manifestfile):
+    if not os.path.exists(manifestfile):
+        return {"fingerprints" : {}, "files" : {}}
+    with open(manifestfile, "r", encoding="utf8") as infile:
+        return json.load(infile)
+
+
+def save_manifest(manifest, manifestfile):
+    with open(manifestfile, "w", encoding="utf8") as outfile:
+        json.dump(manifest, outfile, indent=1, sort_keys=True, ensure_ascii=False)
+
+
+def compare(hashes, entries, fingerprint_ok):
+    """
+    Compare the current files (with their content hashes) to the
+    manifest entries of the previous build. Returns the files that
+    need to be processed and the files that no longer exist.
+    If the fingerprint changed, all files need to be processed.
+    """
+    if fingerprint_ok == False:
+        changed = list(hashes)
+    else:
+        changed = [teifile for teifile in hashes
+                   if teifile not in entries
+                   or entries[teifile]["hash"] != hashes[teifile]]
+    removed = [teifile for teifile in entries if teifile not in hashes]
+    return changed, removed
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Metadata baseline ==
+
+Attribution experiment based exclusively on the metadata (roadmap
+step 6), as a baseline for the stylometric results.
+
+Each novel is described by its metadata from the metadata store (see
+metadata_store.py): year of first publication, length in words, size
+category and time slot (as ordinal codes), reprint count and narrative
+perspective (one column per value). The columns are z-scored within
+each collection and every novel is attributed to the author of its
+nearest neighbour, with the same distance measures and cross-validation
+as in stylometry.py (by default Burrows' Delta, leave-one-out). As the
+metadata take few distinct values, ties are frequent; they go to the
+first novel in the table.
+
+The results are saved in the shape of the stylometric tables, as
+results_overall_metadata.csv and results_authors_<acc|f1>_metadata.csv
+in results/python/, with the same value in each mfw column, so that
+they can be compared with them directly.
+"""
+
+
+# === Import statements ===
+
+import os
+from os.path import join
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+import features
+import stylometry
+import metadata_store
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+resultsdir = join(wdir, "results", "python", "")
+languages = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+classifier = "delta"
+folds = None # Number of folds, or None for leave-one-out
+seed = 42 # For the assignment of documents to folds
+mfws = list(range(100, 2001, 20)) # Columns of the stylometric tables
+workers = 4 # Number of parallel processes (1 = no parallelization)
+
+default_year = 1880 # For novels without a known year of first publication
+numeric = ["firsted-year", "numwords"]
+ordinal = ["sizeCat", "time-slot"]
+nominal = ["reprintCount", "narr-per"]
+
+
+# === Functions ===
+
+def get_matrix(metadata):
+    """
+    Build the matrix of metadata features (novels x features). Missing
+    numeric and ordinal values are replaced by the year 1880 and the
+    collection mean, respectively; missing nominal values get no column.
+    """
+    columns = [metadata["firsted-year"].astype(float).fillna(default_year),
+               metadata["numwords"].astype(float).fillna(metadata["numwords"].astype(float).mean())]
+    for column in ordinal:
+        codes = metadata[column].cat.codes.astype(float).replace(-1, np.nan)
+        columns.append(codes.fillna(codes.mean()))
+    for column in nominal:
+        dummies = pd.get_dummies(metadata[column], dtype=float)
+        columns.extend([dummies[value] for value in dummies.columns])
+    return np.column_stack(columns)
+
+
+def run_language(lang, classifier, folds, seed):
+    """
+    Classify the novels of one language on their metadata.
+    Returns the overall accuracy and the accuracy and F1-score per author.
+    """
+    print(lang)
+    metadata = metadata_store.load_metadata([lang], ["authorlabel"] + numeric + ordinal + nominal)
+    labels = list(metadata["authorlabel"])
+    zscores = features.get_zscores(get_matrix(metadata))
+    assignment = stylometry.get_folds(labels, folds, seed)
+    predictions = stylometry.classify(zscores, labels, classifier, zscores.shape[1], assignment)
+    return stylometry.evaluate(labels, predictions)
+
+
+# === Main ===
+
+def main(languages, classifier, folds, seed, mfws, workers):
+    if not os.path.exists(resultsdir):
+        os.makedirs(resultsdir)
+    arguments = [languages, repeat(classifier), repeat(folds), repeat(seed)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_language, *arguments))
+    else:
+        results = list(map(run_language, *arguments))
+    tables = {"overall" : {}, "authors_acc" : {}, "authors_f1" : {}}
+    for lang, (accuracy, author_acc, author_f1) in zip(languages, results):
+        tables["overall"][lang] = {mfw : accuracy for mfw in mfws}
+        for author in author_acc:
+            tables["authors_acc"][lang + "_" + author] = {mfw : author_acc[author] for mfw in mfws}
+            tables["authors_f1"][lang + "_" + author] = {mfw : author_f1[author] for mfw in mfws}
+    for name, table in tables.items():
+        stylometry.save_table(table, mfws, join(resultsdir, "results_" + name + "_metadata.csv"))
+
+
+if __name__ == "__main__":
+    main(languages, classifier, folds, seed, mfws, workers)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Metadata store ==
+
+One typed, columnar metadata store for all collections (roadmap
+step 4), instead of re-reading and re-parsing the per-language
+metadata TSVs in each script.
+
+The store is a Parquet dataset in metadata/corpus/, partitioned by
+collection (metadata/corpus/collection=<lang>/part-0.parquet), built
+from metadata/<lang>_metadata.tsv as written by extract_metadata.py
+or build_corpus.py. Compared to the TSVs, the columns are typed:
+
+- au-gender, sizeCat, reprintCount, time-slot, narr-per, language:
+  categoricals (sizeCat and time-slot ordered)
+- numwords, au-birth, au-death: integers (missing values as <NA>)
+- firsted-year: the first four-digit year in firsted-yr, as an integer;
+  firsted-yr itself stays as it is in the TEI header ("1851-1853", ...)
+- plaintxt-words: number of tokens in plaintxt/<lang>/<filename>.txt
+  (see tokens.py), so that the plain texts need not be scanned again
+- collection: the partition, e.g. "deu"
+
+Each partition records the hash of the TSV it was built from
+(collection=<lang>/_source.json), so that a partition left behind by a
+later run of extract_metadata.py alone can be recognized as stale.
+
+load_store() reads only the requested collections and columns.
+load_metadata() does the same, but first builds again the partitions
+that are missing or stale; without pyarrow, it reads and types the
+TSVs directly. export_tsv() writes a collection back to the TSV format
+of extract_metadata.py; a store built from a TSV exports it unchanged.
+
+The store requires pandas with pyarrow.
+"""
+
+
+# === Import statements ===
+
+import os
+import json
+import glob
+import importlib.util
+from os.path import join, exists
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import tokens
+import manifest
+import extract_metadata
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+storedir = join(wdir, "metadata", "corpus", "")
+collections = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+workers = 4 # Number of parallel processes (1 = no parallelization)
+parquet = importlib.util.find_spec("pyarrow") is not None # Can the store be used?
+
+integers = ["numwords", "au-birth", "au-death"]
+categories = {"au-gender" : (["F", "M"], False),
+              "sizeCat" : (["short", "medium", "long"], True),
+              "reprintCount" : (["low", "high", "unspecified"], False),
+              "time-slot" : (["T1", "T2", "T3", "T4"], True),
+              "narr-per" : (["heterodiegetic", "homodiegetic", "autodiegetic"], False),
+              "language" : ([], False)} # known values, ordered?
+
+
+# === Functions ===
+
+def get_categorical(values, known, ordered):
+    """
+    Turn a column into a categorical with the known values first and
+    any other values found in the data after them.
+    """
+    others = sorted(set(values.dropna()) - set(known))
+    return pd.Categorical(values, categories=known + others, ordered=ordered)
+
+
+def count_plaintxt(lang, filenames, workers=1):
+    """
+    Number of tokens in the plain text of each file (<NA> if the
+    plain text does not exist).
+    """
+    txtfiles = [join(wdir, "plaintxt", lang, filename+".txt") for filename in filenames]
+    existing = [txtfile for txtfile in txtfiles if exists(txtfile)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            counts = dict(zip(existing, executor.map(tokens.count_words, existing)))
+    else:
+        counts = {txtfile : tokens.count_words(txtfile) for txtfile in existing}
+    return pd.array([counts.get(txtfile) for txtfile in txtfiles], dtype="Int64")
+
+
+def type_table(table, plaintxt_words):
+    """
+    Type the columns of a metadata table read as strings (with "NA"
+    for missing values) and add the number of tokens of each plain text.
+    """
+    table = table.replace("NA", None)
+    for column in integers:
+        table[column] = pd.array(table[column], dtype="Int64")
+    for column, (known, ordered) in categories.items():
+        table[column] = get_categorical(table[column], known, ordered)
+    table["firsted-year"] = pd.array(table["firsted-yr"].str.extract("(\\d{4})")[0], dtype="Int64")
+    table["plaintxt-words"] = pd.array(plaintxt_words, dtype="Int64")
+    return table
+
+
+def get_metadatafile(lang):
+    return join(wdir, "metadata", lang+"_metadata.tsv")
+
+
+def read_table(lang):
+    return pd.read_csv(get_metadatafile(lang), sep="\t", dtype=str, keep_default_na=False)
+
+
+def get_table(lang, workers=1):
+    """
+    Read the metadata TSV of one collection and type its columns.
+    """
+    table = read_table(lang)
+    return type_table(table, count_plaintxt(lang, table["filename"], workers))
+
+
+def save_partition(table, lang):
+    """
+    Replace the partition of one collection in the store, recording
+    the hash of the metadata TSV the table was read from.
+    """
+    partition = join(storedir, "collection="+lang)
+    if not os.path.exists(partition):
+        os.makedirs(partition)
+    for oldfile in glob.glob(join(partition, "*.parquet")):
+        os.remove(oldfile)
+    table.to_parquet(join(partition, "part-0.parquet"), index=False)
+    # Files starting with "_" are not read as part of the dataset
+    with open(join(partition, "_source.json"), "w", encoding="utf8") as outfile:
+        json.dump({"hash" : manifest.get_hash(get_metadatafile(lang))}, outfile)
+
+
+def is_current(lang):
+    """
+    Check whether the partition of one collection exists and was built
+    from the current metadata TSV.
+    """
+    sourcefile = join(storedir, "collection="+lang, "_source.json")
+    if not exists(sourcefile):
+        return False
+    with open(sourcefile, "r", encoding="utf8") as infile:
+        source = json.load(infile)
+    return source["hash"] == manifest.get_hash(get_metadatafile(lang))
+
+
+def load_store(collections=None, columns=None):
+    """
+    Load the metadata of the given collections (default: all), with
+    only the given columns (default: all) and the collection.
+    """
+    if columns is not None:
+        columns = [column for column in columns if column != "collection"] + ["collection"]
+    filters = None
+    if collections is not None:
+        filters = [("collection", "in", list(collections))]
+    return pd.read_parquet(storedir, columns=columns, filters=filters)
+
+
+def load_metadata(collections, columns=None, workers=1):
+    """
+    Load the metadata of the given collections as load_store does,
+    building the partitions that are missing or stale first. Without
+    pyarrow, the metadata TSVs are read and typed instead (counting the
+    plain texts only if plaintxt-words is requested).
+    """
+    if parquet == False:
+        tables = []
+        for lang in collections:
+            table = read_table(lang)
+            if columns is None or "plaintxt-words" in columns:
+                words = count_plaintxt(lang, table["filename"], workers)
+            else:
+                words = [None] * len(table)
+            tables.append(type_table(table, words).assign(collection=lang))
+        metadata = pd.concat(tables, ignore_index=True)
+        if columns is not None:
+            metadata = metadata[[column for column in columns if column != "collection"] + ["collection"]]
+        return metadata
+    for lang in collections:
+        if not is_current(lang):
+            print("Building the metadata store for", lang)
+            save_partition(get_table(lang, workers), lang)
+    return load_store(collections, columns)
+
+
+def export_tsv(lang, metadatafile, ordering=extract_metadata.ordering):
+    """
+    Write the metadata of one collection in the format of
+    extract_metadata.py (with "NA" for missing values).
+    """
+    table = load_store([lang], ordering)[ordering]
+    with open(metadatafile, "w", encoding="utf8") as outfile:
+        table.to_csv(outfile, sep="\t", index=None, na_rep="NA")
+
+
+# === Main ===
+
+def main(collections, workers):
+    for lang in collections:
+        table = get_table(lang, workers)
+        save_partition(table, lang)
+        print(lang, len(table), "rows")
+
+
+if __name__ == "__main__":
+    main(collections, workers)
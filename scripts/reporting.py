@@ -43,6 +43,9 @@ import pandas as pd
 from lxml import etree
 from collections import Counter
 
+import xml_utils
+import header_cache
+
 
 # === Parameters ===
 
@@ -66,6 +69,8 @@ xpaths = {"xmlid" : "//tei:TEI/@xml:id",
           "language" : "//tei:langUsage/tei:language/@ident"}
           
 
+authorxpath = "//tei:titleStmt/tei:author/text()"
+
 ordering = ["filename", "xmlid", "au-name", "title", "au-birth", "au-death",
             "au-gender", "au-ids", "copytext-yr", "firsted-yr", "title-ids",
             "sizeCat", "reprints", "time-slot", "numwords", "language"]
@@ -76,34 +81,29 @@ ordering = ["filename", "xmlid", "au-name", "title", "au-birth", "au-death",
 
 def open_file(teiFile): 
     """
-    Open and parse the XML file. 
+    Open and parse the teiHeader of the XML file 
+    (the text itself is not read, see xml_utils.read_header). 
     Returns an XML tree.
     """
-    with open(teiFile, "r", encoding="utf8") as infile:
-        xml = etree.parse(infile)
-        return xml
+    return xml_utils.read_header(teiFile)
 
 
 
-def get_metadatum(xml, xpath): 
+def get_metadatum(metadatum): 
     """
-    For each metadata key and XPath defined above, retrieve the 
-    metadata item from the XML tree.
+    For each metadata key and XPath defined above, the metadata 
+    item retrieved from the header (None if there is no such item).
     Note that the individual identifers for au-ids and title-ids 
     are not split into individual columns.
     """
-    try: 
-        namespaces = {'tei':'http://www.tei-c.org/ns/1.0',
-                      'eltec':'http://distantreading.net/eltec/ns'}       
-        metadatum = xml.xpath(xpath, namespaces=namespaces)[0]
-    except: 
+    if metadatum is None: 
         metadatum = "NA"
     return metadatum
 
 
-def get_authordata(xml): 
+def get_authordata(authordata): 
     """
-    Retrieve the author field and split it into constituent parts.
+    Split the author field into constituent parts.
     Expected pattern: "name (alternatename) (birth-death)"
     where birth and death are both four-digit years. 
     The alternate name is ignored. 
@@ -111,9 +111,6 @@ def get_authordata(xml):
     entries, as this is not always a trivial decision to make.
     """
     try: 
-        namespaces = {'tei':'http://www.tei-c.org/ns/1.0'}       
-        authordata = xml.xpath("//tei:titleStmt/tei:author/text()",
-                               namespaces=namespaces)[0]
         name = re.search("(.*?) \(", authordata).group(1)
         birth = re.search("\((\d\d\d\d)", authordata).group(1)
         death = re.search("(\d\d\d\d)\)", authordata).group(1)
@@ -287,7 +284,10 @@ def main(teiFolder, metadataFolder, xpaths, ordering, reportFile):
     if not os.path.exists(metadataFolder):
         os.makedirs(metadataFolder)
     allmetadata = []
-    for teiFile in glob.glob(teiFolder): 
+    teiFiles = [teiFile for teiFile in glob.glob(teiFolder) if "schemas" not in basename(teiFile)]
+    # Header fields of all files, parsed only if new or changed (see header_cache.py)
+    allFields = header_cache.get_fields(teiFiles, dict(xpaths, authordata=authorxpath))
+    for teiFile in teiFiles: 
         filename,ext = basename(teiFile).split(".")
         #print(filename)
         if "schemas" not in filename:
@@ -295,12 +295,16 @@ def main(teiFolder, metadataFolder, xpaths, ordering, reportFile):
             metadata = []
             keys.append("filename")
             metadata.append(filename)
-            xml = open_file(teiFile)
-            name,birth,death = get_authordata(xml)
+            fields = allFields[teiFile]
+            if fields is None: 
+                # Could not be read or parsed (see header_cache.py)
+                print("ERROR!!!", filename)
+                continue
+            name,birth,death = get_authordata(fields["authordata"])
             keys.extend(["au-name", "au-birth", "au-death"])
             metadata.extend([name, birth, death])
             for key,xpath in xpaths.items(): 
-                metadatum = get_metadatum(xml, xpath)
+                metadatum = get_metadatum(fields[key])
                 keys.append(key)
                 metadata.append(metadatum)
             allmetadata.append(dict(zip(keys, metadata)))
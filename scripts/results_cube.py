@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Results cube ==
+
+Loader for the result tables (results_<metric>_<classifier>.csv, as
+written by stylo or stylometry.py), so that analysis and plotting
+scripts do not parse the same wide CSV files again and again.
+
+All tables of a results folder are parsed once into a 4-D array
+(metric x classifier x row x mfw), where the metrics are "overall",
+"authors_acc" and "authors_f1" and the rows are the languages (for
+"overall") and the "<lang>_<author>" labels (for the other metrics);
+cells without a value are NaN. The cube is cached in results_cube.npz
+in the same folder and parsed again only if a table is newer than the
+cache or the set of tables has changed.
+
+select() returns the values of one metric and classifier, optionally
+for one language and/or some mfw settings, as a pandas object indexed
+by author (or language, for "overall").
+"""
+
+
+# === Import statements ===
+
+import os
+import re
+import glob
+from os.path import join, basename, getmtime
+
+import numpy as np
+import pandas as pd
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+resultsdir = join(wdir, "results", "")
+tablename = re.compile("results_(overall|authors_acc|authors_f1)_([a-z]+)\\.csv$")
+
+
+# === Functions ===
+
+def find_tables(resultsdir):
+    """
+    Return the result tables of a folder as (metric, classifier, file).
+    Other CSV files (like results_authors_acc_wurzburg_1640mfw.csv)
+    are ignored.
+    """
+    tables = []
+    for csvfile in sorted(glob.glob(join(resultsdir, "results_*.csv"))):
+        match = tablename.match(basename(csvfile))
+        if match:
+            tables.append((match.group(1), match.group(2), csvfile))
+    return tables
+
+
+def parse_tables(tables):
+    """
+    Read all tables into one array with labels for each axis.
+    """
+    frames = {(metric, classifier) : pd.read_csv(csvfile, sep=",", index_col=0)
+              for metric, classifier, csvfile in tables}
+    metrics = sorted(set([metric for metric, classifier in frames]))
+    classifiers = sorted(set([classifier for metric, classifier in frames]))
+    rows = list(dict.fromkeys([row for frame in frames.values() for row in frame.index]))
+    mfws = sorted(set([int(mfw) for frame in frames.values() for mfw in frame.columns]))
+    values = np.full((len(metrics), len(classifiers), len(rows), len(mfws)), np.nan)
+    for (metric, classifier), frame in frames.items():
+        frame = frame.set_axis([int(mfw) for mfw in frame.columns], axis=1).reindex(index=rows, columns=mfws)
+        values[metrics.index(metric), classifiers.index(classifier)] = frame.to_numpy(dtype=float)
+    return {"values" : values,
+            "metrics" : np.array(metrics),
+            "classifiers" : np.array(classifiers),
+            "rows" : np.array(rows),
+            "mfws" : np.array(mfws),
+            "files" : np.array([basename(csvfile) for metric, classifier, csvfile in tables])}
+
+
+def is_current(cubefile, tables):
+    if not os.path.exists(cubefile) or len(tables) == 0:
+        return False
+    if max([getmtime(csvfile) for metric, classifier, csvfile in tables]) > getmtime(cubefile):
+        return False
+    with np.load(cubefile) as cached:
+        return list(cached["files"]) == [basename(csvfile) for metric, classifier, csvfile in tables]
+
+
+def load_cube(resultsdir=resultsdir):
+    """
+    Return the cube of a results folder, from the cache if it is current.
+    """
+    cubefile = join(resultsdir, "results_cube.npz")
+    tables = find_tables(resultsdir)
+    if not is_current(cubefile, tables):
+        np.savez(cubefile, **parse_tables(tables))
+    with np.load(cubefile) as cached:
+        return {key : cached[key] for key in cached.files}
+
+
+def select(cube, metric, classifier, lang=None, mfw=None):
+    """
+    Values of one metric and classifier: a DataFrame of rows x mfw, or a
+    Series of rows if mfw is a single setting. With lang, only the rows
+    of that language are returned, indexed by author (for the author
+    metrics) instead of "<lang>_<author>".
+    """
+    values = cube["values"][list(cube["metrics"]).index(metric), list(cube["classifiers"]).index(classifier)]
+    rows = cube["rows"]
+    selected = ~np.all(np.isnan(values), axis=1)
+    if lang is not None:
+        if metric == "overall":
+            selected &= rows == lang
+        else:
+            selected &= np.char.startswith(rows, lang+"_")
+    table = pd.DataFrame(values[selected], index=rows[selected], columns=cube["mfws"])
+    if lang is not None and metric != "overall":
+        table.index = table.index.str[len(lang)+1:]
+    if mfw is not None:
+        return table[mfw]
+    return table
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Sampling ==
+
+Random sampling of the novels into bags of words (roadmap step 3), as
+stylo's "random.sampling", to get several instances per author.
+
+The samples are drawn from the word counts of each novel rather than
+from its text: a sample of n words only depends on how often each word
+occurs in the novel, so it can be drawn directly as a vector of counts.
+The counts of the most frequent words are taken from the token store
+(see features.get_counts), with one more column for all other words.
+Without replacement (as in stylo's default), the counts of a sample
+follow a multivariate hypergeometric distribution; with replacement, a
+multinomial distribution. All samples of a language are drawn at once
+with NumPy from a seeded generator. Novels shorter than the sample size
+give one sample with all their words (as in segments.py).
+
+For the attribution, the relative frequencies of the samples are
+z-scored and each sample is attributed to the author of its nearest
+neighbour among the samples of all other novels, so that no sample is
+compared with another sample of the same novel (see stylometry.py).
+This is repeated with new samples for a given number of resamplings;
+the results are the means over all resamplings, saved in the shape of
+the stylometric tables in results/python/sampled/.
+"""
+
+
+# === Import statements ===
+
+import os
+from os.path import join
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+import features
+import stylometry
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+resultsdir = join(wdir, "results", "python", "sampled", "")
+languages = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+classifiers = ["delta", "eder", "wurzburg"]
+mfws = [100, 200, 500, 1000, 2000]
+size = 10000 # Number of words per sample
+samples = 10 # Number of samples per novel
+replacement = False # Draw the words of a sample with replacement?
+resamplings = 10 # Number of times the samples are drawn again
+folds = None # Number of folds (of novels), or None for leave-one-novel-out
+seed = 42
+workers = 4 # Number of parallel processes (1 = no parallelization)
+
+
+# === Functions ===
+
+def get_novel_counts(lang, mfw):
+    """
+    Return the author labels and the word counts of each novel of one
+    language: the mfw most frequent words, plus all other words in the
+    last column.
+    """
+    filenames, labels, words, documents = features.read_corpus(lang)
+    words, counts = features.get_counts(words, documents, mfw)
+    others = np.array([len(document) for document in documents], dtype=np.int64) - np.sum(counts, axis=1)
+    return labels, np.column_stack([counts, others])
+
+
+def draw_samples(counts, size, samples, replacement, rng):
+    """
+    Draw samples of size words from each row of counts (novels x words).
+    Returns the counts of the samples (samples x words) and the novel
+    of each sample.
+    """
+    totals = np.sum(counts, axis=1)
+    long = np.flatnonzero(totals > size)
+    short = np.flatnonzero(totals <= size)
+    if replacement:
+        drawn = rng.multinomial(size, counts[long] / totals[long][:,None], size=(samples, len(long)))
+        drawn = np.swapaxes(drawn, 0, 1).reshape(-1, counts.shape[1])
+    else:
+        drawn = np.concatenate([np.zeros((0, counts.shape[1]), dtype=np.int64)]
+                               + [rng.multivariate_hypergeometric(counts[i], size, size=samples, method="marginals")
+                                  for i in long])
+    novels = np.concatenate([np.repeat(long, samples), short])
+    drawn = np.concatenate([drawn, counts[short]])
+    order = np.argsort(novels, kind="stable")
+    return drawn[order], novels[order]
+
+
+def run_language(lang, classifiers, mfws, size, samples, replacement, resamplings, folds, seed):
+    """
+    Draw the samples of one language resamplings times and classify
+    them with all classifiers and mfw settings. Returns the mean results
+    in the form of stylometry.run_language.
+    """
+    print(lang)
+    rng = np.random.default_rng(seed)
+    labels, counts = get_novel_counts(lang, max(mfws))
+    assignment = stylometry.get_folds(labels, folds, seed)
+    overall = {classifier : {lang : {}} for classifier in classifiers}
+    authors_acc = {classifier : {} for classifier in classifiers}
+    authors_f1 = {classifier : {} for classifier in classifiers}
+    for resampling in range(resamplings):
+        drawn, novels = draw_samples(counts, size, samples, replacement, rng)
+        zscores = features.get_zscores(drawn[:,:-1] / np.sum(drawn, axis=1)[:,None])
+        sample_labels = np.array(labels)[novels]
+        for classifier in classifiers:
+            for mfw, predictions in stylometry.sweep(zscores, sample_labels, classifier, mfws, assignment[novels]):
+                accuracy, author_acc, author_f1 = stylometry.evaluate(sample_labels, predictions)
+                overall[classifier][lang][mfw] = overall[classifier][lang].get(mfw, 0) + accuracy / resamplings
+                for author in author_acc:
+                    row = lang + "_" + author
+                    acc = authors_acc[classifier].setdefault(row, {})
+                    acc[mfw] = acc.get(mfw, 0) + author_acc[author] / resamplings
+                    f1 = authors_f1[classifier].setdefault(row, {})
+                    f1[mfw] = f1.get(mfw, 0) + author_f1[author] / resamplings
+    return overall, authors_acc, authors_f1
+
+
+# === Main ===
+
+def main(languages, classifiers, mfws, size, samples, replacement, resamplings, folds, seed, workers):
+    if not os.path.exists(resultsdir):
+        os.makedirs(resultsdir)
+    arguments = [languages, repeat(classifiers), repeat(mfws), repeat(size), repeat(samples),
+                 repeat(replacement), repeat(resamplings), repeat(folds), repeat(seed)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_language, *arguments))
+    else:
+        results = list(map(run_language, *arguments))
+    for classifier in classifiers:
+        for name, position in [("overall", 0), ("authors_acc", 1), ("authors_f1", 2)]:
+            table = {}
+            for result in results:
+                table.update(result[position][classifier])
+            stylometry.save_table(table, mfws, join(resultsdir, "results_" + name + "_" + classifier + ".csv"))
+
+
+if __name__ == "__main__":
+    main(languages, classifiers, mfws, size, samples, replacement, resamplings, folds, seed, workers)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Segments ==
+
+Segmentation of the novels into fixed-size samples (roadmap step 3),
+to increase the number of instances per author.
+
+No copies of the text are written. Instead, an index with one row per
+segment is saved to features/<lang>_segments.tsv: the file name, the
+number of the segment, the byte offsets of its first and last token in
+the plain text file (start, end) and its number of tokens. Segments
+are read back through a memory-mapped file.
+
+Two sampling modes are available, as in stylo:
+- "consecutive": segments follow each other through the novel, with
+  the given overlap (in tokens); a remainder shorter than the sample
+  size is dropped.
+- "random": a given number of segments per novel starts at randomly
+  chosen tokens (reproducible with the seed). Unlike stylo's random
+  sampling, which draws single words, the segments are contiguous.
+Novels shorter than the sample size give one segment with all tokens.
+"""
+
+
+# === Import statements ===
+
+import os
+import csv
+import glob
+import mmap
+from os.path import join, basename
+
+import numpy as np
+
+import tokens
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+featuresdir = join(wdir, "features", "")
+languages = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+size = 20000 # Number of tokens per segment
+overlap = 0 # Number of tokens shared by consecutive segments
+sampling = "consecutive" # "consecutive" or "random"
+samples = 10 # Number of segments per novel (random sampling only)
+seed = 42
+
+
+# === Functions ===
+
+def get_offsets(txtfile):
+    """
+    Return the byte offsets of the start and end of each token.
+    Character positions are converted to byte positions from the
+    UTF-8 length of each code point.
+    """
+    starts = []
+    ends = []
+    position = 0
+    for chunk in tokens.iter_chunks(txtfile, lower=False):
+        codepoints = np.frombuffer(chunk.encode("utf-32-le"), dtype=np.uint32)
+        widths = 1 + (codepoints >= 0x80) + (codepoints >= 0x800) + (codepoints >= 0x10000)
+        bytepos = np.concatenate([[0], np.cumsum(widths, dtype=np.int64)]) + position
+        spans = np.array([match.span() for match in tokens.pattern.finditer(chunk)], dtype=np.int64).reshape(-1, 2)
+        starts.append(bytepos[spans[:,0]])
+        ends.append(bytepos[spans[:,1]])
+        position = bytepos[-1]
+    return np.concatenate(starts), np.concatenate(ends)
+
+
+def check_overlap(size, overlap):
+    if not 0 <= overlap < size:
+        raise ValueError("The overlap must be at least 0 and less than the sample size: "
+                         + str(overlap) + " for a size of " + str(size))
+
+
+def get_segments(ntokens, size, overlap, sampling, samples, rng):
+    """
+    Return the first and last token of each segment.
+    """
+    check_overlap(size, overlap)
+    if ntokens <= size:
+        return [(0, ntokens-1)]
+    if sampling == "consecutive":
+        firsts = range(0, ntokens-size+1, size-overlap)
+    elif sampling == "random":
+        firsts = sorted([int(first) for first in rng.integers(0, ntokens-size+1, samples)])
+    else:
+        raise ValueError("Unknown sampling mode: " + sampling)
+    return [(first, first+size-1) for first in firsts]
+
+
+def segment_file(txtfile, size, overlap, sampling, samples, rng):
+    """
+    Return the index rows for one plain text file.
+    """
+    filename = basename(txtfile)[:-4]
+    starts, ends = get_offsets(txtfile)
+    rows = []
+    if len(starts) == 0:
+        return rows
+    for number, (first, last) in enumerate(get_segments(len(starts), size, overlap, sampling, samples, rng)):
+        rows.append({"filename" : filename,
+                     "segment" : number,
+                     "start" : int(starts[first]),
+                     "end" : int(ends[last]),
+                     "tokens" : last-first+1})
+    return rows
+
+
+def save_index(rows, indexfile):
+    with open(indexfile, "w", encoding="utf8", newline="") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=["filename", "segment", "start", "end", "tokens"], delimiter="\t")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def load_index(lang):
+    with open(join(featuresdir, lang+"_segments.tsv"), "r", encoding="utf8", newline="") as infile:
+        rows = list(csv.DictReader(infile, delimiter="\t"))
+    for row in rows:
+        for key in ["segment", "start", "end", "tokens"]:
+            row[key] = int(row[key])
+    return rows
+
+
+def iter_segments(lang):
+    """
+    Yield each row of the index with the text of its segment,
+    read through a memory-mapped view of the plain text file.
+    """
+    rows = load_index(lang)
+    current = None
+    textmap = None
+    try:
+        for row in rows:
+            if row["filename"] != current:
+                if textmap is not None:
+                    textmap.close()
+                current = row["filename"]
+                with open(join(wdir, "plaintxt", lang, current+".txt"), "rb") as infile:
+                    textmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            yield row, textmap[row["start"]:row["end"]].decode("utf8")
+    finally:
+        if textmap is not None:
+            textmap.close()
+
+
+# === Main ===
+
+def main(languages, size, overlap, sampling, samples, seed):
+    check_overlap(size, overlap)
+    if not os.path.exists(featuresdir):
+        os.makedirs(featuresdir)
+    rng = np.random.default_rng(seed)
+    for lang in languages:
+        rows = []
+        for txtfile in sorted(glob.glob(join(wdir, "plaintxt", lang, "*.txt"))):
+            rows.extend(segment_file(txtfile, size, overlap, sampling, samples, rng))
+        save_index(rows, join(featuresdir, lang+"_segments.tsv"))
+        print(lang, len(rows), "segments")
+
+
+if __name__ == "__main__":
+    main(languages, size, overlap, sampling, samples, seed)
@@ -1,11 +1,23 @@
 import numpy as np
 from glob import glob
-import xml.etree.ElementTree as ET
 import shutil
 from os.path import join
 import os
 import re
+import json
+from concurrent.futures import ProcessPoolExecutor
 
+import header_cache
+
+
+# === Parameters ===
+
+eltecdir = join("..", "..", "..", "eltec", "")
+originalsdir = join("..", "originals", "")
+indexfile = join("..", "metadata", "selection_index.json")
+minimum = 3 # Number of novels an author needs to be selected
+workers = 4 # Number of parallel processes (1 = no parallelization)
+authorxpath = "(//tei:author)[1]/text()"
 
 
 def get_all_xmls(input_path):
@@ -22,25 +34,38 @@ def get_all_xmls(input_path):
     return xmls
 
 
-def get_author(input_xml):
-    """get the text from the author tag of one xml
-    
-    Arguments
-    __________
-    input_xml: /path/to/input/xml/file.xml (type str)
-    """
-    # first parse the input_xml
-    xml = ET.parse(input_xml)
-    root = xml.getroot()
-    author = root.find('.//{http://www.tei-c.org/ns/1.0}author')
+def clean_author(author):
+    """normalize the whitespace of an author field"""
     # strip removes preceding and trailing whitespace
-    author = author.text.strip()
+    author = author.strip()
     author = re.sub("\n", "", author)
     author = re.sub("[ ]{1,50}", " ", author)
     return author
 
 
-def get_author_statistics(teipath, input_xmls):
+def scan_dir(teipath):
+    """get the author of each xml of one ELTeC dir from the header
+    cache (see header_cache.py), which parses only the files that
+    are new or have changed; xmls that cannot be read or parsed
+    (or have no author) are reported and left out
+    
+    Arguments
+    _________
+    teipath: /path/to/language/dir/level1/ (type str)
+    """
+    xmls = get_all_xmls(teipath)
+    fields = header_cache.get_fields([join(teipath, xml) for xml in xmls], {"author" : authorxpath})
+    authors = {}
+    for xml in xmls:
+        xmlfields = fields[join(teipath, xml)]
+        if xmlfields is None or xmlfields["author"] is None:
+            print("ERROR!!!", xml)
+            continue
+        authors[xml] = clean_author(xmlfields["author"])
+    return authors
+
+
+def get_author_statistics(authors):
     """
     write a dict of the following form:
     author_stats = {'Author_1': ['book0.xml', 'book1.xml', 'book2.xml'...], 
@@ -51,15 +76,15 @@ def get_author_statistics(teipath, input_xmls):
     Arguments
     _________
     
-    input_xmls = all the xmls to check for the author tag (type list)
-                ['/path/to/first/xml/book0.xml', 
-                 '/path/to/second/xml/book1.xml', 
-                 ....]
+    authors = the author of each xml (type dict)
+                {'book0.xml': 'Author_1',
+                 'book1.xml': 'Author_1',
+                 ....}
                     
     """
     author_stats = {}
-    for xml in input_xmls:
-        author = get_author(join(teipath, xml))
+    for xml in sorted(authors):
+        author = authors[xml]
         try:
             author_stats[author].append(xml)
         except KeyError:
@@ -67,44 +92,100 @@ def get_author_statistics(teipath, input_xmls):
     return author_stats
 
 
-def move_to_dir(teipath, input_author, author_stats, target_dir):
+def link_or_copy(source, target):
+    """hardlink a file, or copy it (with its modification time)
+    if the target is on another file system
     """
-    move all xmls of one given author into a given src directory
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def is_current(source, target):
+    if not os.path.exists(target):
+        return False
+    if os.path.samefile(source, target):
+        return True
+    source, target = os.stat(source), os.stat(target)
+    return source.st_size == target.st_size and source.st_mtime_ns == target.st_mtime_ns
+
+
+def materialise(teipath, selected, previous, target_dir):
+    """make target_dir contain the selected xmls: files that are
+    no longer selected are removed, new or changed files are linked
+    (or copied), all other files are left alone
     
     Arguments
     _________
-    input_author: 'Castro Osório, Ana de (1839-1871)' (type str),
-    author_stats: author statistics (type dict)
+    teipath: /path/to/language/dir/level1/ (type str)
+    selected: the selected xmls (type list)
+    previous: the xmls selected by the previous run (type list)
     target_dir: '/path/to/the/target/destination' (type str)
     
     """
-    xmls = author_stats[input_author]
     if not os.path.exists(target_dir): 
         os.makedirs(target_dir)
-    for xml in xmls:
-        shutil.copy(join(teipath, xml), target_dir)
-    
-    
+    removed = 0
+    for xml in set(previous) - set(selected):
+        if os.path.exists(join(target_dir, xml)):
+            os.remove(join(target_dir, xml))
+            removed += 1
+    updated = 0
+    for xml in selected:
+        source = join(teipath, xml)
+        target = join(target_dir, xml)
+        if not is_current(source, target):
+            if os.path.exists(target):
+                os.remove(target)
+            link_or_copy(source, target)
+            updated += 1
+    return updated, removed
+
+
+def select_language(language, previous, minimum):
+    """scan one ELTeC repository and materialise the novels of all
+    authors with at least minimum novels in originals/<language>/
+    """
+    teipath = join(eltecdir, "ELTeC-"+language, "level1", "")
+    authors = scan_dir(teipath)
+    author_stats = get_author_statistics(authors)
+    selected_authors = [author for author in author_stats if len(author_stats[author]) >= minimum]
+    selected = sorted([xml for author in selected_authors for xml in author_stats[author]])
+    updated, removed = materialise(teipath, selected, previous, join(originalsdir, language, ""))
+    report = [language, len(authors), "files found,", len(author_stats), "different authors found,",
+              len(selected_authors), "different authors with", minimum, "or more novels found,",
+              updated, "files updated,", removed, "files removed"]
+    return selected, report
+
+
+def load_index(indexfile):
+    """load the xmls selected by the previous run of each language
+    """
+    if not os.path.exists(indexfile):
+        return {"selected" : {}}
+    with open(indexfile, "r", encoding="utf8") as infile:
+        return {"selected" : json.load(infile).get("selected", {})}
+
+
+def save_index(index, indexfile):
+    with open(indexfile, "w", encoding="utf8") as outfile:
+        json.dump(index, outfile, indent=1, sort_keys=True, ensure_ascii=False)
+
 
+def main(language_list, minimum, workers):
+    index = load_index(indexfile)
+    previous = [index["selected"].get(language, []) for language in language_list]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(select_language, language_list, previous, [minimum]*len(language_list)))
+    else:
+        results = [select_language(*arguments, minimum) for arguments in zip(language_list, previous)]
+    for language, (selected, report) in zip(language_list, results):
+        print(*report)
+        index["selected"][language] = selected
+    save_index(index, indexfile)
 
-def main(language_list):
-    for language in language_list:
-        print("\n====== " + language + " ======")
-        teipath = join("..", "..", "..", "eltec", "ELTeC-"+language, "level1", "")
-        print(teipath)
-        xmls = get_all_xmls(teipath)
-        print(len(xmls), "files found")
-        #print(xmls)
-        author_stats = get_author_statistics(teipath, xmls)
-        print(len(author_stats), "different authors found")
-        threetitleauthors = []
-        for author in author_stats:
-            #print(author, len(author_stats[author]))
-            if len(author_stats[author]) >= 3:
-                threetitleauthors.append(author)
-                #print("-", author)
-                move_to_dir(teipath, author, author_stats, target_dir = join("..", "originals", language, ""))
-        print(len(threetitleauthors), "different authors with three or more novels found")
-
-main(["deu", "fra", "eng", "hun", "por", "pol", "nor", "rom"])
 
+if __name__ == "__main__":
+    main(["deu", "fra", "eng", "hun", "por", "pol", "nor", "rom"], minimum, workers)
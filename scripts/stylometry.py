@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Stylometry ==
+
+This script runs the authorship attribution experiments (roadmap
+step 7) directly in Python, instead of running stylo in R for each
+configuration.
+
+For each language, the document-term matrix of relative frequencies
+is taken from the shared feature store (see features.py), which builds
+it once from the plain texts. The frequencies are z-scored over the
+whole collection. Then, for each classifier (Burrows' Delta, Eder's
+Delta, Wurzburg Delta) and each number of most frequent words (mfw),
+every novel is attributed to the author of its nearest neighbour among
+all other novels (leave-one-out cross-validation). The pairwise
+distances for all mfw settings are computed in one pass over the words
+per classifier (see distances.py).
+
+The results are saved in the same shape as the tables produced with
+stylo: results_overall_<classifier>.csv (accuracy per language) and
+results_authors_<acc|f1>_<classifier>.csv (per "<lang>_<author>"),
+each with one column per mfw setting.
+"""
+
+
+# === Import statements ===
+
+import os
+from os.path import join
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+import features
+import distances
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+resultsdir = join(wdir, "results", "python", "")
+languages = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+classifiers = ["delta", "eder", "wurzburg"]
+mfws = list(range(100, 2001, 20))
+workers = 4 # Number of parallel processes (1 = no parallelization)
+
+
+# === Functions ===
+
+def classify(zscores, labels, classifier, mfw, assignment=None):
+    """
+    Attribute each document to the author of the nearest document in
+    another fold (see get_folds), using the first mfw words. The
+    distances are computed once for all documents (see distances.py).
+    Without an assignment, this is leave-one-out cross-validation.
+    """
+    labels = np.array(labels)
+    if assignment is None:
+        assignment = np.arange(len(labels))
+    matrix = distances.get_matrix(zscores, classifier, mfw)
+    return labels[distances.get_nearest(matrix, assignment)]
+
+
+def sweep(zscores, labels, classifier, mfws, assignment=None):
+    """
+    Like classify, for several mfw settings in one pass over the words
+    (see distances.get_sweep). Yields each mfw with its predictions.
+    """
+    labels = np.array(labels)
+    if assignment is None:
+        assignment = np.arange(len(labels))
+    for mfw, matrix in distances.get_sweep(zscores, classifier, mfws):
+        yield mfw, labels[distances.get_nearest(matrix, assignment)]
+
+
+def get_folds(labels, folds, seed):
+    """
+    Assign each document to a cross-validation fold. With folds=None,
+    each document is its own fold (leave-one-out). Otherwise, the
+    documents of each author are shuffled and dealt out to the folds
+    in turn, so that each fold has documents by as many authors as
+    possible and the folds have (nearly) the same size.
+    """
+    if folds is None:
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    labels = np.array(labels)
+    assignment = np.zeros(len(labels), dtype=int)
+    dealt = 0
+    for author in sorted(set(labels)):
+        documents = rng.permutation(np.flatnonzero(labels == author))
+        assignment[documents] = (dealt + np.arange(len(documents))) % folds
+        dealt += len(documents)
+    return assignment
+
+
+def evaluate(labels, predictions):
+    """
+    Return the overall accuracy and the accuracy and F1-score per author.
+    """
+    labels = np.array(labels)
+    accuracy = np.mean(labels == predictions)
+    author_acc = {}
+    author_f1 = {}
+    for author in sorted(set(labels)):
+        correct = np.sum((labels == author) & (predictions == author))
+        tested = np.sum(labels == author)
+        predicted = np.sum(predictions == author)
+        author_acc[author] = correct / tested
+        author_f1[author] = 2 * correct / (tested + predicted)
+    return accuracy, author_acc, author_f1
+
+
+def run_language(lang, classifiers, mfws):
+    """
+    Run all classifiers and mfw settings for one language.
+    Returns the results as nested dictionaries:
+    {classifier : {row : {mfw : value}}} for each of the three tables.
+    """
+    print(lang)
+    filenames, labels, words, freqs = features.get_features(lang, max(mfws))
+    zscores = features.get_zscores(freqs[:,:max(mfws)])
+    overall = {}
+    authors_acc = {}
+    authors_f1 = {}
+    for classifier in classifiers:
+        overall[classifier] = {lang : {}}
+        authors_acc[classifier] = {}
+        authors_f1[classifier] = {}
+        for mfw, predictions in sweep(zscores, labels, classifier, mfws):
+            accuracy, author_acc, author_f1 = evaluate(labels, predictions)
+            overall[classifier][lang][mfw] = accuracy
+            for author in author_acc:
+                row = lang + "_" + author
+                authors_acc[classifier].setdefault(row, {})[mfw] = author_acc[author]
+                authors_f1[classifier].setdefault(row, {})[mfw] = author_f1[author]
+    return overall, authors_acc, authors_f1
+
+
+def save_table(table, mfws, csvfile):
+    """
+    Save a table {row : {mfw : value}} in the format written by stylo / R:
+    quoted labels and header, numbers with 15 significant digits.
+    """
+    with open(csvfile, "w", encoding="utf8") as outfile:
+        outfile.write(",".join(["\"\""] + ["\"" + str(mfw) + "\"" for mfw in mfws]) + "\n")
+        for row in table:
+            values = [table[row].get(mfw, np.nan) for mfw in mfws]
+            values = ["NA" if np.isnan(value) else "%.15g" % value for value in values]
+            outfile.write(",".join(["\"" + row + "\""] + values) + "\n")
+
+
+# === Main ===
+
+def main(languages, classifiers, mfws, workers):
+    if not os.path.exists(resultsdir):
+        os.makedirs(resultsdir)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_language, languages, repeat(classifiers), repeat(mfws)))
+    else:
+        results = [run_language(lang, classifiers, mfws) for lang in languages]
+    for classifier in classifiers:
+        for name, position in [("overall", 0), ("authors_acc", 1), ("authors_f1", 2)]:
+            table = {}
+            for result in results:
+                table.update(result[position][classifier])
+            save_table(table, mfws, join(resultsdir, "results_" + name + "_" + classifier + ".csv"))
+
+
+if __name__ == "__main__":
+    main(languages, classifiers, mfws, workers)
@@ -14,6 +14,10 @@ from lxml import etree
 import pandas as pd
 import re
 import csv
+import tokens
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from functools import lru_cache
 
 
 #==============
@@ -67,11 +71,27 @@ def get_text(tei, params):
     return text
 
 
+@lru_cache(maxsize=4096)
+def clean_whitespace(whitespace): 
+    """
+    Normalize one sequence of spaces, newlines and tabs. 
+    """
+    whitespace = re.sub("[ ]{2,20}", " ", whitespace)
+    whitespace = re.sub("\n{2,20}", "\n", whitespace)
+    whitespace = re.sub("[ \n]{2,20}", " \n", whitespace)
+    whitespace = re.sub("\t{1,20}", "\t", whitespace)
+    return whitespace
+
+
 def clean_text(text): 
-    text = re.sub("[ ]{2,20}", " ", text)
-    text = re.sub("\n{2,20}", "\n", text)
-    text = re.sub("[ \n]{2,20}", " \n", text)
-    text = re.sub("\t{1,20}", "\t", text)
+    """
+    Normalize whitespace in a single pass over the text. All of the
+    rules only ever match within a sequence of spaces, newlines and
+    tabs, so each such sequence (of two or more characters) is 
+    normalized on its own; the result is cached, as the same few
+    sequences occur over and over again. 
+    """
+    text = re.sub("[ \n\t]{2,}", lambda match: clean_whitespace(match.group(0)), text)
     return text
     
 
@@ -84,6 +104,94 @@ def extract_text(tei, params):
 
 
 
+# === Extracting the plain text (streaming)
+
+def get_preceding(event, element): 
+    """
+    Return the text between the previous node and this event. 
+    """
+    if event == "end": 
+        if len(element) > 0: 
+            return element[-1].tail
+        return element.text
+    previous = element.getprevious()
+    if previous is not None: 
+        return previous.tail
+    return element.getparent().text
+
+
+def iter_text(teifile, params): 
+    """
+    Stream the text nodes of tei:text in document order, without
+    building the full tree. Processed elements are cleared as soon as
+    they are no longer needed. The result is the same as with 
+    remove_tags, remove_elements and get_text: text nodes inside 
+    removed elements are skipped, all others (including those in hi,
+    which stripping the tag does not merge) are kept as they are. 
+    """
+    tei = "{http://www.tei-c.org/ns/1.0}"
+    removed = {tei+param for param,value in params.items() if value == False}
+    depth = 0 # Nesting level of tei:text
+    skip = 0 # Nesting level of removed elements
+    for event, element in etree.iterparse(teifile, events=("start", "end", "comment", "pi")): 
+        if depth > 0 and skip == 0: 
+            preceding = get_preceding(event, element)
+            if preceding: 
+                yield preceding
+        if event in ("start", "end") and element.tag in removed: 
+            skip += 1 if event == "start" else -1
+        if element.tag == tei+"text": 
+            depth += 1 if event == "start" else -1
+        if event == "end": 
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            while parent is not None and element.getprevious() is not None: 
+                del parent[0]
+
+
+def iter_chunks(teifile, params, size=65536): 
+    """
+    Join the text nodes with spaces (as get_text does) and clean them
+    chunk by chunk. Chunks are cut right before a whitespace sequence, 
+    so that clean_text gives the same result as on the whole text. 
+    """
+    buffer = ""
+    first = True
+    for segment in iter_text(teifile, params): 
+        if first == False: 
+            buffer += " "
+        buffer += segment
+        first = False
+        if len(buffer) > size: 
+            head = buffer.rstrip(" \n\t")
+            if len(head) > 0: 
+                yield clean_text(head)
+                buffer = buffer[len(head):]
+    yield clean_text(buffer)
+
+
+def stream_text(teifile, paths, params, filename): 
+    """
+    Extract the text of one file and write it to disk incrementally
+    (if plaintext is set). Returns the number of words; chunks never
+    split a word, so they can be counted one by one. 
+    """
+    num_words = 0
+    outfile = None
+    if params["plaintext"] == True: 
+        outfile = open(join(paths["txtpath"], filename+".txt"), "w", encoding="utf8")
+    try: 
+        for chunk in iter_chunks(teifile, params): 
+            if outfile is not None: 
+                outfile.write(chunk)
+            num_words += tokens.count_text(chunk)
+    finally: 
+        if outfile is not None: 
+            outfile.close()
+    return num_words
+
+
+
 # === Modernize the text
 
 def get_mods(paths):
@@ -93,28 +201,40 @@ def get_mods(paths):
         return mods
 
 
-def modernize(text, mods): 
-    for old,new in mods.items(): 
-        old = "(\W)"+old+"(\W)"
-        new = "\\1"+new+"\\2"
-        text = re.sub(old, new, text)
+@lru_cache(maxsize=None)
+def compile_mods(modsfile): 
+    """
+    Compile all modifications into one pattern, once per process. 
+    The old forms are escaped and the longest come first, so that 
+    e.g. "&c" wins over "&". As before, a form is only replaced when 
+    it is preceded and followed by a non-word character. 
+    """
+    mods = get_mods({"modsfile":modsfile})
+    olds = sorted(mods, key=len, reverse=True)
+    pattern = re.compile("(?<=\\W)(?:" + "|".join([re.escape(old) for old in olds]) + ")(?=\\W)")
+    return pattern, mods
+
+
+def modernize(text, pattern, mods): 
+    """
+    Replace all old forms in a single pass over the text. 
+    """
+    if len(mods) == 0: 
+        return text
+    text = pattern.sub(lambda match: mods[match.group(0)], text)
     return text
-    r'\bis\b'
 
 
 def modernize_text(text, paths):
-    mods = get_mods(paths)
-    text = modernize(text, mods)
+    pattern, mods = compile_mods(paths["modsfile"])
+    text = modernize(text, pattern, mods)
     return text
 
 
 
 # === Get word count
 
-def get_counts(text): 
-    # tokens
-    words = re.split("\W+", text)
-    num_words = len(words)
+def get_category(num_words): 
     if num_words > 99999: 
         len_category = "long"
     elif num_words > 49999: 
@@ -123,6 +243,13 @@ def get_counts(text):
         len_category = "short"
     else: 
         len_category = "too short!"
+    return len_category
+
+
+def get_counts(text): 
+    # tokens, see tokens.py
+    num_words = tokens.count_text(text)
+    len_category = get_category(num_words)
     return num_words, len_category
 
 
@@ -151,24 +278,47 @@ def save_counts(len_words, len_category):
 # Main 
 #==============
 
-def main(paths, params): 
+def process_file(teifile, paths, params): 
+    """
+    Extract, optionally modernize and save the text of one file. 
+    Returns the filename and the word counts (or None). 
+    """
+    filename = get_filename(teifile)
+    if params.get("stream", False) == True and params["modernize"] == False: 
+        num_words = stream_text(teifile, paths, params, filename)
+        counts = None
+        if params["counts"] == True: 
+            counts = num_words, get_category(num_words)
+        return filename, counts
+    tei = read_tei(teifile)
+    text = extract_text(tei, params)
+    if params["modernize"] == True: 
+        text = modernize_text(text, paths)
+    counts = None
+    if params["counts"] == True: 
+        counts = get_counts(text)
+    if params["plaintext"] == True: 
+        save_text(text, paths, filename)
+    return filename, counts
+
+
+def main(paths, params, workers=1): 
+    """
+    Process all files matching the teipath. With workers > 1, the files
+    are distributed across a pool of processes; output file names
+    and counts are the same as in the serial mode. 
+    """
     helper(paths, params)
     len_category = {}
     len_words = {}
-    for teifile in glob.glob(paths["teipath"]):
-        filename = get_filename(teifile)
-        tei = read_tei(teifile)
-        text = extract_text(tei, params)
-        if params["modernize"] == True: 
-            text = modernize_text(text, paths)
-        else: 
-            pass
-        if params["counts"] == True: 
-            len_words[filename], len_category[filename] = get_counts(text)
-        if params["plaintext"] == True: 
-            save_text(text, paths, filename)
+    teifiles = sorted(glob.glob(paths["teipath"]))
+    if workers > 1: 
+        with ProcessPoolExecutor(max_workers=workers) as executor: 
+            results = list(executor.map(process_file, teifiles, repeat(paths), repeat(params)))
+    else: 
+        results = [process_file(teifile, paths, params) for teifile in teifiles]
+    for filename, counts in results: 
+        if counts is not None: 
+            len_words[filename], len_category[filename] = counts
     if params["counts"] == True: 
         save_counts(len_words, len_category)
-    
-    
-
@@ -30,6 +30,11 @@ back = False # Include back matter (other than notes)?
 plaintext = True # Extract and save plain text?
 modernize = False # Perform spelling modifications?
 counts = False # Establish and save wordcounts?
+stream = True # Extract text without building the full tree? (not with modernize)
+
+params = {"note":note, "head":head, "pb":pb, "foreign":foreign, "trailer":trailer, "front":front, "back":back, "quote":quote, "modernize":modernize, "counts":counts, "plaintext":plaintext, "stream":stream}
+
+workers = 4 # Number of parallel processes (1 = no parallelization)
 
 
 
@@ -37,12 +42,12 @@ counts = False # Establish and save wordcounts?
 # Run tei2txt
 #=======================
 
-for lang in languages: 
-    print("\n====== " + lang + " ======") 		
-    wdir = join("..")
-    teipath = join(wdir, "originals", lang, "*.xml")
-    txtpath = join(wdir, "plaintxt", lang, "")
-    modsfile = join(wdir, "tei2txt_mods.csv")
-    paths = {"teipath":teipath, "txtpath":txtpath, "modsfile":modsfile}
-    params = {"note":note, "head":head, "pb":pb, "foreign":foreign, "trailer":trailer, "front":front, "back":back, "quote":quote, "modernize":modernize, "counts":counts, "plaintext":plaintext}
-    tei2txt.main(paths, params)
+if __name__ == "__main__": 
+    for lang in languages: 
+        print("\n====== " + lang + " ======") 		
+        wdir = join("..")
+        teipath = join(wdir, "originals", lang, "*.xml")
+        txtpath = join(wdir, "plaintxt", lang, "")
+        modsfile = join(wdir, "scripts", "tei2txt_mods.csv")
+        paths = {"teipath":teipath, "txtpath":txtpath, "modsfile":modsfile}
+        tei2txt.main(paths, params, workers)
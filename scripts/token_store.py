@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Token store ==
+
+Integer-encoded copy of the plain texts, so that the novels are read
+and tokenized (see tokens.py) only once per language.
+
+For each language, the tokens of all files in plaintxt/<lang>/ are
+stored in features/:
+
+- <lang>_tokens.npy: uint32 array of token ids, all novels one after
+  the other (in the order of the offsets table)
+- <lang>_offsets.tsv: file name and the first and last+1 position of
+  each novel in the token array (start, end)
+- <lang>_vocab.tsv: the words and their frequency in the collection,
+  one per line, ranked by frequency (ties broken alphabetically); the
+  id of a word is its line number, counting from 0
+
+The token array is loaded memory-mapped, so loading a language copies
+nothing and the tokens of a novel are a view (tokens[start:end]).
+Sampling, segmentation and counting can work on these arrays: the
+counts of the n most frequent words of a novel, for example, are
+np.bincount(tokens[start:end], minlength=n)[:n], as the most frequent
+words have the lowest ids.
+"""
+
+
+# === Import statements ===
+
+import os
+import csv
+import glob
+from os.path import join, basename, getmtime
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import tokens
+
+
+# === Parameters ===
+
+wdir = join("..", "")
+featuresdir = join(wdir, "features", "")
+languages = ["deu", "eng", "fra", "hun", "nor", "pol", "por", "rom"]
+workers = 4 # Number of parallel processes (1 = no parallelization)
+
+
+# === Functions ===
+
+def encode_file(txtfile):
+    """
+    Tokenize one text file with ids of its own (in the order in which
+    the words first occur). Returns the words and the token ids.
+    """
+    vocabulary = {}
+    ids = [np.zeros(0, dtype=np.uint32)]
+    for chunk in tokens.iter_chunks(txtfile):
+        ids.append(np.fromiter((vocabulary.setdefault(token, len(vocabulary))
+                                for token in tokens.pattern.findall(chunk)), dtype=np.uint32))
+    return list(vocabulary), np.concatenate(ids)
+
+
+def get_vocabulary(encoded):
+    """
+    Rank the words of all files by their frequency (ties broken
+    alphabetically). Returns the words and their frequencies.
+    """
+    total = Counter()
+    for words, ids in encoded:
+        total.update(dict(zip(words, np.bincount(ids, minlength=len(words)).tolist())))
+    words = sorted(total, key=lambda word: (-total[word], word))
+    return words, [total[word] for word in words]
+
+
+def get_filenames(lang):
+    return {"tokens" : join(featuresdir, lang+"_tokens.npy"),
+            "offsets" : join(featuresdir, lang+"_offsets.tsv"),
+            "vocab" : join(featuresdir, lang+"_vocab.tsv")}
+
+
+def get_txtfiles(lang):
+    return sorted(glob.glob(join(wdir, "plaintxt", lang, "*.txt")))
+
+
+def read_offsets(offsetsfile):
+    with open(offsetsfile, "r", encoding="utf8", newline="") as infile:
+        rows = list(csv.DictReader(infile, delimiter="\t"))
+    filenames = [row["filename"] for row in rows]
+    offsets = np.array([0] + [int(row["end"]) for row in rows], dtype=np.int64)
+    return filenames, offsets
+
+
+def is_current(lang):
+    """
+    Check whether the store exists, is newer than the plain texts and
+    has the same files.
+    """
+    filenames = get_filenames(lang)
+    if not all([os.path.exists(filename) for filename in filenames.values()]):
+        return False
+    txtfiles = get_txtfiles(lang)
+    if len(txtfiles) > 0 and max([getmtime(txtfile) for txtfile in txtfiles]) > getmtime(filenames["tokens"]):
+        return False
+    stored, offsets = read_offsets(filenames["offsets"])
+    return stored == [basename(txtfile)[:-4] for txtfile in txtfiles]
+
+
+def save_store(lang, filenames, encoded, words, counts):
+    """
+    Write the token ids of all files into one memory-mapped array,
+    translating the ids of each file into the ids of the vocabulary.
+    """
+    if not os.path.exists(featuresdir):
+        os.makedirs(featuresdir)
+    paths = get_filenames(lang)
+    ranks = {word : rank for rank, word in enumerate(words)}
+    offsets = np.cumsum([0] + [len(ids) for local, ids in encoded])
+    store = np.lib.format.open_memmap(paths["tokens"], mode="w+", dtype=np.uint32, shape=(int(offsets[-1]),))
+    for (local, ids), start, end in zip(encoded, offsets[:-1], offsets[1:]):
+        mapping = np.array([ranks[word] for word in local], dtype=np.uint32)
+        store[start:end] = mapping[ids]
+    store.flush()
+    del store
+    with open(paths["offsets"], "w", encoding="utf8", newline="") as outfile:
+        writer = csv.writer(outfile, delimiter="\t")
+        writer.writerow(["filename", "start", "end"])
+        writer.writerows(zip(filenames, offsets[:-1].tolist(), offsets[1:].tolist()))
+    with open(paths["vocab"], "w", encoding="utf8") as outfile:
+        for word, count in zip(words, counts):
+            outfile.write(word + "\t" + str(count) + "\n")
+
+
+def build_store(lang, workers=1):
+    print("Building token store for", lang)
+    txtfiles = get_txtfiles(lang)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            encoded = list(executor.map(encode_file, txtfiles))
+    else:
+        encoded = [encode_file(txtfile) for txtfile in txtfiles]
+    words, counts = get_vocabulary(encoded)
+    save_store(lang, [basename(txtfile)[:-4] for txtfile in txtfiles], encoded, words, counts)
+
+
+def load_store(lang):
+    """
+    Load the token store of one language: the file names, the offsets
+    of the files (the tokens of file i are tokens[offsets[i]:offsets[i+1]]),
+    the words and their frequencies and the (memory-mapped) token ids.
+    """
+    paths = get_filenames(lang)
+    filenames, offsets = read_offsets(paths["offsets"])
+    with open(paths["vocab"], "r", encoding="utf8") as infile:
+        fields = infile.read().replace("\n", "\t").split("\t")[:-1] # word, count, word, count...
+    words = fields[0::2]
+    counts = np.array(fields[1::2], dtype=np.int64)
+    ids = np.load(paths["tokens"], mmap_mode="r")
+    return filenames, offsets, words, counts, ids
+
+
+def get_store(lang, workers=1):
+    """
+    Return the token store of one language (see load_store), building
+    it first if needed.
+    """
+    if not is_current(lang):
+        build_store(lang, workers)
+    return load_store(lang)
+
+
+# === Main ===
+
+def main(languages, workers):
+    for lang in languages:
+        build_store(lang, workers)
+
+
+if __name__ == "__main__":
+    main(languages, workers)
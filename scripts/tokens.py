@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+== Tokens ==
+
+Tokenizer and word counter for the plain text files.
+
+A token is a sequence of letters (in any script, so that the
+diacritics in hun, pol, rom etc. are part of the words), lowercased.
+Files are read in chunks and each chunk is cut after its last
+non-letter character, so that no token is split between two chunks;
+the tokens of a whole novel are never held in memory at once.
+"""
+
+
+# === Import statements ===
+
+import re
+
+
+# === Parameters ===
+
+pattern = re.compile("[^\\W\\d_]+") # Sequences of letters
+chunksize = 1048576 # Number of characters read at once
+
+
+# === Functions ===
+
+def iter_chunks(txtfile, size=chunksize, lower=True):
+    """
+    Read a text file in chunks that end with a non-letter character
+    (except for the last one) and lowercase them (if lower is set).
+    Line endings are left as they are, so that the chunks add up to
+    the exact content of the file.
+    """
+    carry = ""
+    with open(txtfile, "r", encoding="utf8", newline="") as infile:
+        for chunk in iter(lambda: infile.read(size), ""):
+            chunk = carry + chunk
+            cut = len(chunk)
+            while cut > 0 and pattern.match(chunk, cut-1):
+                cut -= 1
+            carry = chunk[cut:]
+            yield chunk[:cut].lower() if lower else chunk[:cut]
+    yield carry.lower() if lower else carry
+
+
+def count_text(text):
+    """
+    Count the tokens in a string.
+    """
+    return sum(1 for token in pattern.finditer(text))
+
+
+def count_words(txtfile):
+    """
+    Count the tokens in a text file.
+    """
+    return sum([count_text(chunk) for chunk in iter_chunks(txtfile)])
+
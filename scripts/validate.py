@@ -4,9 +4,13 @@
 
 import os
 import glob
+import csv
 from lxml import etree
 import sys
 from os.path import join
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 
 # === Parameters === 
@@ -14,6 +18,8 @@ from os.path import join
 wdir = join("..", "")
 languages = ["deu", "fra", "eng", "hun", "nor", "pol", "por", "rom"]
 rngfile = join(wdir, "scripts", "eltec-1.rng")
+reportfile = join(wdir, "metadata", "validation_report.tsv")
+workers = 4 # Number of parallel processes (1 = no parallelization)
 
 
 # === Functions === 
@@ -28,48 +34,90 @@ def parse_tei(teifile):
     #return teiparsed
 
 
-def validate_xml(teiparsed, filename, rngfile):
+@lru_cache(maxsize=None)
+def get_validator(rngfile):
+    """
+    Parse and compile the RelaxNG schema.
+    This happens only once per process and schema file.
+    """
     rngparsed = etree.parse(rngfile)
     rngvalidator = etree.RelaxNG(rngparsed)
+    return rngvalidator
+
+
+def validate_xml(teiparsed, filename, rngfile):
+    """
+    Validate a parsed file against the schema.
+    Returns the result and a list of error lines.
+    """
+    rngvalidator = get_validator(rngfile)
     validation = rngvalidator.validate(teiparsed)
-    log = rngvalidator.error_log
-    if validation == True: 
-        pass
-        #print("\n" + filename + "\n- OK, file valid.")
-    else:
-        print(filename, "\n- SORRY, file not valid!")
-        print(log)
-        #print(log.last_error)
-        #print(log.last_error.domain_name)
-        #print(log.last_error.type_name)
+    errors = []
+    if validation == False:
+        errors = [str(error) for error in rngvalidator.error_log]
+    return validation, errors
 
 
 def check_ids(teifile, teiparsed): 
+        """
+        Compare the xml:id to the file name.
+        Returns "ok", "faulty (file, text)" or "missing".
+        """
         idno_file = os.path.basename(teifile).split(".")[0].split("_")[0]
         namespaces = {'tei':'http://www.tei-c.org/ns/1.0',
                       'eltec':'http://distantreading.net/eltec/ns'}       
         try: 
             idno_text = teiparsed.xpath("//tei:TEI/@xml:id", namespaces=namespaces)[0]    
             if idno_file == idno_text: 
-                pass
-                #print("- OK, xml:id fine!")
-            if idno_file != idno_text:  
-                print("- SORRY, xml:id is faulty!", idno_file, idno_text)
+                return "ok"
+            else:
+                return "faulty (" + idno_file + ", " + idno_text + ")"
         except: 
-            print("- SORRY, can't find the ID")
-            
+            return "missing"
+
+
+def validate_file(teifile, rngfile):
+    """
+    Parse, validate and check one file.
+    Returns one row of the validation report.
+    """
+    language = os.path.basename(os.path.dirname(teifile))
+    filename,ext = os.path.basename(teifile).split(".")
+    teiparsed = parse_tei(teifile)
+    validation, errors = validate_xml(teiparsed, filename, rngfile)
+    ids = check_ids(teifile, teiparsed)
+    return {"language" : language,
+            "filename" : filename,
+            "valid" : validation,
+            "ids" : ids,
+            "errors" : " | ".join(errors)}
+
+
+def save_report(report, reportfile):
+    """
+    Save the validation results for all files to a TSV file.
+    """
+    with open(reportfile, "w", encoding="utf8", newline="") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=["language", "filename", "valid", "ids", "errors"], delimiter="\t")
+        writer.writeheader()
+        writer.writerows(report)
 
 
 # === Main ===
 
-def main(teipath, rngfile): 
+def main(languages, rngfile, reportfile, workers):
+	teifiles = []
 	for language in languages: 
-		print("\n====== " + language + " ======") 
 		teipath = join(wdir, "originals", language, "*.xml*")
-		for teifile in glob.glob(teipath):
-			filename,ext = os.path.basename(teifile).split(".")
-			teiparsed = parse_tei(teifile)
-			validate_xml(teiparsed, filename, rngfile)
-			check_ids(teifile, teiparsed)
-
-main(languages, rngfile)
+		teifiles.extend(sorted(glob.glob(teipath)))
+	if workers > 1:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			report = list(executor.map(validate_file, teifiles, repeat(rngfile), chunksize=8))
+	else:
+		report = [validate_file(teifile, rngfile) for teifile in teifiles]
+	save_report(report, reportfile)
+	invalid = [row["filename"] for row in report if row["valid"] == False or row["ids"] != "ok"]
+	print(len(report), "files checked,", len(invalid), "with problems:", invalid)
+
+if __name__ == "__main__":
+	main(languages, rngfile, reportfile, workers)
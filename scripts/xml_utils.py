@@ -1,9 +1,12 @@
 import numpy as np
 from glob import glob
-import xml.etree.ElementTree as ET
+from lxml import etree
 import shutil
 
 
+TEXT = '{http://www.tei-c.org/ns/1.0}text'
+
+
 def get_all_xmls(input_path):
     """get all xmls for one ELTeC dir 
     
@@ -16,6 +19,25 @@ def get_all_xmls(input_path):
     # rstrip('/') removes a '/' at the end if it exists
     return sorted(glob(input_path.rstrip('/')+'/level1/*.xml'))
 
+def read_header(input_xml):
+    """parse one xml up to the start of its <text> element, so that
+    only the teiHeader (a few kilobytes) is read instead of the novel.
+    Returns an lxml tree of the TEI element without the text, on which
+    the usual XPaths for the header can be run. Files without a
+    <text> element are parsed completely.
+    
+    Arguments
+    __________
+    input_xml: /path/to/input/xml/file.xml (type str)
+    """
+    for event, element in etree.iterparse(input_xml, events=('start',), tag=TEXT):
+        parent = element.getparent()
+        if parent is not None:
+            parent.remove(element)
+            return etree.ElementTree(parent)
+    return etree.parse(input_xml)
+
+
 def get_author(input_xml):
     """get the text from the author tag of one xml
     
@@ -23,8 +45,8 @@ def get_author(input_xml):
     __________
     input_xml: /path/to/input/xml/file.xml (type str)
     """
-    # first parse the input_xml
-    xml = ET.parse(input_xml)
+    # first parse the header of the input_xml
+    xml = read_header(input_xml)
     root = xml.getroot()
     author = root.find('.//{http://www.tei-c.org/ns/1.0}author')
     # strip removes preceding and trailing whitespace